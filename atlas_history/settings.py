@@ -61,7 +61,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'history.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -157,6 +157,41 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+# Периодические задачи (нужен запущенный celery beat)
+CELERY_BEAT_SCHEDULE = {
+    "cleanup-export-jobs": {
+        "task": "history.tasks.cleanup_export_jobs",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+# Cache
+# Без DJANGO_CACHE_URL используется локальный кэш процесса; в проде лучше
+# указать Redis, чтобы версия данных и кэш списков были общими для воркеров.
+DJANGO_CACHE_URL = os.environ.get("DJANGO_CACHE_URL", "")
+if DJANGO_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": DJANGO_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Сколько секунд кэшируется версия данных (импорт и ревизия из БД): столько
+# другие процессы могут отдавать старые страницы после изменения данных
+HISTORY_DATA_VERSION_TTL = int(os.environ.get("HISTORY_DATA_VERSION_TTL", "30"))
+# Время жизни закэшированных данных страницы списка заявок
+HISTORY_LIST_CACHE_TIMEOUT = int(os.environ.get("HISTORY_LIST_CACHE_TIMEOUT", "3600"))
+# Сколько секунд кэшируется токен API после успешной проверки
+HISTORY_TOKEN_CACHE_TTL = int(os.environ.get("HISTORY_TOKEN_CACHE_TTL", "300"))
+# Через сколько дней удаляются фоновые выгрузки и их файлы (cleanup_exports)
+HISTORY_EXPORT_TTL_DAYS = int(os.environ.get("HISTORY_EXPORT_TTL_DAYS", "7"))
 
 LOGIN_URL = '/admin/login/'
 
@@ -167,6 +202,10 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Media files (фоновые выгрузки ExportJob)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = Path(os.environ.get("DJANGO_MEDIA_ROOT", BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
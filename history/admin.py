@@ -1,30 +1,80 @@
 from django.contrib import admin, messages
 from django.core.management import call_command
+from django.db import transaction
 
-from .models import Application, StatusHistory, ImportHistory, ExportSchedule
+from .caching import bump_data_version
+from .models import Application, StatusHistory, ImportHistory, ExportSchedule, ExportJob
+
+
+class DataVersionAdminMixin:
+    """
+    Правки данных в админке меняют версию данных (сбрасывают кэши и ETag API).
+    Ревизия увеличивается в той же транзакции, что и сама правка, и становится
+    версией (change_version) затронутых заявок — правка попадает в change feed.
+    """
+
+    def affected_application_ids(self, queryset):
+        """id заявок, данные которых меняет правка объектов из queryset."""
+        return []
+
+    def mark_changed(self, application_ids):
+        with transaction.atomic():
+            revision = bump_data_version()
+            if application_ids:
+                Application.objects.filter(pk__in=application_ids).update(change_version=revision)
+
+    def save_model(self, request, obj, form, change):
+        # До сохранения — на случай, если объект перенесли к другой заявке
+        application_ids = self.affected_application_ids(type(obj).objects.filter(pk=obj.pk)) if change else []
+        super().save_model(request, obj, form, change)
+        application_ids += self.affected_application_ids(type(obj).objects.filter(pk=obj.pk))
+        self.mark_changed(application_ids)
+
+    def delete_model(self, request, obj):
+        application_ids = self.affected_application_ids(type(obj).objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        self.mark_changed(application_ids)
+
+    def delete_queryset(self, request, queryset):
+        application_ids = self.affected_application_ids(queryset)
+        super().delete_queryset(request, queryset)
+        self.mark_changed(application_ids)
 
 
 @admin.register(Application)
-class ApplicationAdmin(admin.ModelAdmin):
+class ApplicationAdmin(DataVersionAdminMixin, admin.ModelAdmin):
     list_display = ("rr_id", "last_name", "first_name", "program_name", "current_atlas_status", "current_rr_status")
     search_fields = ("rr_id", "last_name", "first_name", "email", "snils")
     list_filter = ("current_atlas_status", "current_rr_status", "program_name", "region")
 
+    def affected_application_ids(self, queryset):
+        return list(queryset.values_list("pk", flat=True))
+
 
 @admin.register(StatusHistory)
-class StatusHistoryAdmin(admin.ModelAdmin):
+class StatusHistoryAdmin(DataVersionAdminMixin, admin.ModelAdmin):
     list_display = ("application", "atlas_status", "rr_status", "snapshot_dt")
     list_filter = ("atlas_status", "rr_status")
     search_fields = ("application__rr_id", "application__last_name", "application__first_name")
 
+    def affected_application_ids(self, queryset):
+        return list(queryset.values_list("application_id", flat=True).distinct())
+
 
 @admin.register(ImportHistory)
-class ImportHistoryAdmin(admin.ModelAdmin):
+class ImportHistoryAdmin(DataVersionAdminMixin, admin.ModelAdmin):
     list_display = ("filename", "snapshot_dt", "upload_dt", "created_count", "updated_count")
     list_filter = ("upload_dt",)
     search_fields = ("filename",)
 
 
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("user", "export_format", "status", "data_version", "created_at", "finished_at")
+    list_filter = ("status", "export_format")
+    search_fields = ("user__username", "cache_key")
+
+
 @admin.register(ExportSchedule)
 class ExportScheduleAdmin(admin.ModelAdmin):
     list_display = ("name", "enabled", "interval_minutes", "start_time", "end_time", "end_date", "last_run_at")
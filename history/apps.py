@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HistoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'history'
+
+    def ready(self):
+        # Обработчики сигналов, сбрасывающие кэш токенов API
+        from . import authentication  # noqa: F401
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .caching import make_cache_key
+
+
+def token_cache_key(key: str) -> str:
+    return make_cache_key('token', key)
+
+
+def token_cache_enabled() -> bool:
+    """
+    Кэшировать токены можно только в общем для всех воркеров кэше (Redis и т.п.):
+    с локальным кэшем процесса сброс при отзыве токена не дошёл бы
+    до других воркеров, и отозванный токен работал бы там до истечения TTL.
+    """
+    if getattr(settings, 'HISTORY_TOKEN_CACHE_TTL', 300) <= 0:
+        return False
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication с кэшем: найденные (user, token) хранятся в кэше
+    HISTORY_TOKEN_CACHE_TTL секунд, поэтому повторные запросы с тем же токеном
+    не делают запросов Token + User к БД.
+
+    Кэш сбрасывается при удалении токена и при любом сохранении пользователя
+    (в том числе деактивации), см. обработчики сигналов ниже. С локальным
+    кэшем процесса (LocMem) токен каждый раз проверяется по БД, см. token_cache_enabled.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache_enabled():
+            return super().authenticate_credentials(key)
+
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), getattr(settings, 'HISTORY_TOKEN_CACHE_TTL', 300))
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def _forget_deleted_token(sender, instance, **kwargs):
+    cache.delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=get_user_model())
+def _forget_user_tokens(sender, instance, **kwargs):
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    cache.delete_many([token_cache_key(key) for key in keys])
@@ -0,0 +1,98 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DataRevision, ImportHistory
+
+
+DATA_VERSION_KEY = "history:data_version"
+
+
+def get_data_version():
+    """
+    Возвращает «версию данных» — тройку (id, changed_at, revision):
+    id последнего ImportHistory, время последнего изменения данных
+    и ревизию из DataRevision.
+
+    Версия используется как часть ключей кэша и ETag. Значение кэшируется
+    на HISTORY_DATA_VERSION_TTL секунд, чтобы повторные запросы вообще
+    не обращались к БД. Ревизия хранится в БД, поэтому изменение, сделанное
+    в одном процессе, остальные увидят не позже чем через этот TTL
+    (свой процесс — сразу, см. bump_data_version).
+    """
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        last_import = (
+            ImportHistory.objects
+            .order_by('-pk')
+            .values_list('pk', 'upload_dt')
+            .first()
+        ) or (0, None)
+        revision, changed_at = (
+            DataRevision.objects
+            .filter(pk=DataRevision.SINGLETON_PK)
+            .values_list('revision', 'changed_at')
+            .first()
+        ) or (0, None)
+        version = (last_import[0], changed_at or last_import[1], revision)
+        cache.set(
+            DATA_VERSION_KEY,
+            version,
+            getattr(settings, 'HISTORY_DATA_VERSION_TTL', 30),
+        )
+    return version
+
+
+def bump_data_version() -> int:
+    """
+    Отмечает изменение данных: увеличивает ревизию в DataRevision в текущей
+    транзакции (вместе с самим изменением) и после коммита сбрасывает
+    закэшированную версию. Вызывается импортом, правками в админке и командами,
+    меняющими заявки или историю. Возвращает новую ревизию.
+
+    Строка ревизии блокируется до конца транзакции, поэтому ревизии
+    фиксируются строго по возрастанию.
+    """
+    with transaction.atomic():
+        row, _ = (
+            DataRevision.objects
+            .select_for_update()
+            .get_or_create(pk=DataRevision.SINGLETON_PK)
+        )
+        row.revision += 1
+        row.changed_at = timezone.now()
+        row.save(update_fields=['revision', 'changed_at'])
+    transaction.on_commit(lambda: cache.delete(DATA_VERSION_KEY))
+    return row.revision
+
+
+def user_permission_set(user):
+    """
+    Набор прав пользователя, влияющий на отображение страниц:
+    отсортированные имена групп и признак суперпользователя.
+    """
+    groups = sorted(user.groups.values_list('name', flat=True))
+    return (bool(user.is_superuser), tuple(groups))
+
+
+def _digest(parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def make_cache_key(prefix: str, *parts) -> str:
+    """
+    Строит компактный ключ кэша из произвольных JSON‑сериализуемых частей.
+    """
+    return f"history:{prefix}:{_digest(parts)}"
+
+
+def make_etag(*parts) -> str:
+    """
+    Строит ETag (уже в кавычках, как ожидает get_conditional_response).
+    """
+    return f'"{_digest(parts)}"'
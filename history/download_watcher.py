@@ -0,0 +1,250 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Временные файлы браузера во время загрузки (Chrome/Edge — .crdownload)
+TEMP_SUFFIXES = (".crdownload", ".part", ".tmp")
+
+# Сигнатура End Of Central Directory: есть в конце любого целого zip (xlsx — это zip)
+ZIP_EOCD_SIGNATURE = b"PK\x05\x06"
+# EOCD (22 байта) + максимальный комментарий архива (65535 байт)
+ZIP_EOCD_MAX_OFFSET = 22 + 0xFFFF
+
+
+def has_zip_footer(path: Path) -> bool:
+    """
+    Проверяет, что файл дописан до конца: в хвосте есть запись EOCD zip‑архива.
+    """
+    try:
+        size = path.stat().st_size
+        if size < 22:
+            return False
+        with path.open("rb") as f:
+            f.seek(max(size - ZIP_EOCD_MAX_OFFSET, 0))
+            return ZIP_EOCD_SIGNATURE in f.read()
+    except OSError:
+        return False
+
+
+class _Inotify:
+    """
+    Минимальная обёртка над inotify (Linux) через ctypes: события создания
+    и переименования файлов в одном каталоге.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, path: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CREATE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CLOSE_WRITE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """
+        События (mask, cookie, имя файла), накопившиеся за timeout секунд.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, mask, cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            events.append((mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DownloadWatcher:
+    """
+    Следит за папкой загрузок браузера и дожидается файла ожидаемой загрузки
+    (expect() перед кликом по кнопке скачивания, затем wait()).
+
+    Одновременно отслеживается только одна загрузка: браузер создаёт файл,
+    когда сервер начал отвечать, а не в момент клика, поэтому порядок появления
+    файлов не совпадает с порядком кликов, и несколько параллельных загрузок
+    нельзя надёжно сопоставить со строками выгрузок.
+
+    На Linux реагирует на события inotify (в том числе переименование
+    .crdownload → итоговое имя, отслеживаемое по cookie события); на других
+    системах (или без inotify) — опрос каталога раз в poll_interval.
+
+    Файл считается готовым, когда у него не временное имя, размер не меняется
+    между двумя проверками и (для .xlsx/.zip) в конце есть запись EOCD zip‑архива.
+    """
+
+    def __init__(
+        self,
+        download_dir: Path,
+        pattern: str = "*.xlsx",
+        poll_interval: float = 0.2,
+        baseline: Optional[Iterable[Path]] = None,
+        use_inotify: bool = True,
+    ):
+        self.download_dir = Path(download_dir)
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        if baseline is None:
+            baseline = self.download_dir.iterdir()
+        self._baseline = {Path(p).name for p in baseline}
+        self._cond = threading.Condition()
+        self._pending: deque = deque()
+        self._origin: Dict[str, Any] = {}
+        self._moved_from: Dict[int, str] = {}
+        self._sizes: Dict[str, int] = {}
+        self._results: Dict[Any, Path] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(self.download_dir)
+            except (OSError, AttributeError):
+                self._inotify = None
+
+    def start(self):
+        with self._cond:
+            self._scan_new_names()
+        self._thread = threading.Thread(target=self._run, name="download-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def expect(self, key):
+        """
+        Регистрирует ожидаемую загрузку; вызывать до клика по кнопке скачивания.
+        Предыдущая загрузка к этому моменту должна быть получена через wait().
+        """
+        with self._cond:
+            if self._pending or self._origin:
+                raise RuntimeError(
+                    "Предыдущая загрузка ещё не завершена: DownloadWatcher отслеживает одну загрузку за раз."
+                )
+            self._pending.append(key)
+
+    def wait(self, key, timeout: float = 60) -> Path:
+        """
+        Ждёт, пока файл загрузки key будет полностью записан, и возвращает путь к нему.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while key not in self._results:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Не удалось дождаться загрузки файла экспорта.")
+                self._cond.wait(remaining)
+            return self._results.pop(key)
+
+    def _is_candidate(self, name: str) -> bool:
+        return name.endswith(TEMP_SUFFIXES) or fnmatch.fnmatch(name, self.pattern)
+
+    def _assign(self, name: str):
+        if name in self._baseline or name in self._origin or not self._pending:
+            return
+        if not self._is_candidate(name):
+            return
+        self._origin[name] = self._pending.popleft()
+
+    def _scan_new_names(self):
+        try:
+            names = sorted(
+                (entry for entry in os.scandir(self.download_dir) if entry.is_file()),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+        except OSError:
+            return
+        for entry in names:
+            # Без inotify переименование не связать с исходным файлом —
+            # сопоставляем только итоговые имена
+            if self._inotify is None and entry.name.endswith(TEMP_SUFFIXES):
+                continue
+            self._assign(entry.name)
+
+    def _handle_events(self, events):
+        for mask, cookie, name in events:
+            if mask & _Inotify.IN_MOVED_FROM:
+                self._moved_from[cookie] = name
+            elif mask & _Inotify.IN_MOVED_TO and cookie in self._moved_from:
+                old_name = self._moved_from.pop(cookie)
+                if old_name in self._origin:
+                    self._origin[name] = self._origin.pop(old_name)
+                else:
+                    self._assign(name)
+            elif mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                self._assign(name)
+
+    def _check_complete(self):
+        for name, key in list(self._origin.items()):
+            if name.endswith(TEMP_SUFFIXES):
+                continue
+            path = self.download_dir / name
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            stable = size > 0 and self._sizes.get(name) == size
+            self._sizes[name] = size
+            if not stable:
+                continue
+            if path.suffix.lower() in (".xlsx", ".zip") and not has_zip_footer(path):
+                continue
+            del self._origin[name]
+            self._sizes.pop(name, None)
+            self._results[key] = path
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._inotify is not None:
+                events = self._inotify.read(self.poll_interval)
+                with self._cond:
+                    self._handle_events(events)
+                    self._check_complete()
+            else:
+                self._stopped.wait(self.poll_interval)
+                with self._cond:
+                    self._scan_new_names()
+                    self._check_complete()
@@ -0,0 +1,214 @@
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import unquote, urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def http_download_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Настройки прямого скачивания по HTTP (секция http_download конфига) с умолчаниями.
+    """
+    cfg = config.get("http_download", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "url_attribute": cfg.get("url_attribute") or "href",
+        "url_template": cfg.get("url_template") or "",
+        "id_attribute": cfg.get("id_attribute") or "data-id",
+        "max_workers": max(int(cfg.get("max_workers", 4)), 1),
+        "chunk_size": int(cfg.get("chunk_size", 64 * 1024)),
+        "timeout": int(cfg.get("timeout", 120)),
+        "retries": int(cfg.get("retries", 3)),
+    }
+
+
+def build_session(
+    cookies,
+    user_agent: Optional[str] = None,
+    pool_size: int = 4,
+    retries: int = 3,
+) -> requests.Session:
+    """
+    HTTP‑сессия с куками браузера и пулом соединений на pool_size
+    параллельных скачиваний (keep-alive, повтор при сетевых ошибках и 5xx).
+    cookies — список словарей в формате driver.get_cookies().
+    """
+    session = requests.Session()
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def session_from_driver(driver, config: Dict[str, Any]) -> requests.Session:
+    """
+    Переносит авторизацию из Selenium в HTTP‑клиент: куки текущей сессии
+    браузера и его User-Agent (некоторые сайты привязывают сессию к нему).
+    """
+    settings = http_download_settings(config)
+    try:
+        user_agent = driver.execute_script("return navigator.userAgent")
+    except Exception:  # noqa: BLE001
+        user_agent = None
+    return build_session(
+        driver.get_cookies(),
+        user_agent=user_agent,
+        pool_size=settings["max_workers"],
+        retries=settings["retries"],
+    )
+
+
+def resolve_download_url(
+    url: Optional[str],
+    export_id: Optional[str],
+    base_url: str,
+    config: Dict[str, Any],
+) -> Optional[str]:
+    """
+    URL файла выгрузки для строки списка: значение атрибута кнопки скачивания
+    (http_download.url_attribute, по умолчанию href) или шаблон
+    http_download.url_template с id из атрибута строки (id_attribute).
+    None — если URL определить не удалось.
+    """
+    settings = http_download_settings(config)
+    if settings["url_template"]:
+        if not export_id:
+            return None
+        return urljoin(base_url, settings["url_template"].format(id=export_id))
+
+    if not url or url.startswith(("javascript:", "#")):
+        return None
+    return urljoin(base_url, url)
+
+
+def _filename_from_response(response: requests.Response, fallback_name: str) -> str:
+    disposition = response.headers.get("Content-Disposition", "")
+    match = re.search(r"filename\*=(?:UTF-8'')?([^;]+)", disposition, re.IGNORECASE)
+    if not match:
+        match = re.search(r'filename="?([^";]+)"?', disposition, re.IGNORECASE)
+    if match:
+        name = unquote(match.group(1).strip().strip('"'))
+    else:
+        name = unquote(Path(urlparse(response.url).path).name)
+    # Только имя файла, без каталогов из заголовка
+    name = Path(name).name
+    return name if name.endswith(".xlsx") else fallback_name
+
+
+def _reserve_part_file(download_dir: Path, name: str):
+    """
+    Атомарно занимает свободное имя файла: создаёт «имя.part» с флагом O_EXCL.
+    Параллельные загрузки с одинаковым именем из Content-Disposition получают
+    разные имена («name (1).xlsx» и т.д.). Итоговый файл появляется только через
+    replace() своего .part, поэтому проверка target после создания .part
+    не может разойтись с другими загрузками.
+    Возвращает (итоговый путь, путь .part, открытый на запись .part).
+    """
+    stem, suffix = Path(name).stem, Path(name).suffix
+    counter = 0
+    while True:
+        target = download_dir / (name if counter == 0 else f"{stem} ({counter}){suffix}")
+        part = target.with_name(target.name + ".part")
+        counter += 1
+        try:
+            file = part.open("xb")
+        except FileExistsError:
+            continue
+        if target.exists():
+            file.close()
+            part.unlink(missing_ok=True)
+            continue
+        return target, part, file
+
+
+def download_file(
+    session: requests.Session,
+    url: str,
+    download_dir: Path,
+    fallback_name: str,
+    timeout: int = 120,
+    chunk_size: int = 64 * 1024,
+) -> Path:
+    """
+    Скачивает файл потоково (без загрузки в память целиком) во временный
+    .part и переименовывает его после полной загрузки. При ошибке .part удаляется.
+    Ответ, похожий на страницу логина (HTML), считается ошибкой авторизации.
+    """
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if "text/html" in response.headers.get("Content-Type", ""):
+            raise PermissionError(
+                f"Вместо файла выгрузки получена HTML‑страница (сессия не принята?): {url}"
+            )
+        target, part, file = _reserve_part_file(
+            download_dir, _filename_from_response(response, fallback_name)
+        )
+        try:
+            with file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        file.write(chunk)
+            part.replace(target)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+    return target
+
+
+class ExportDownloader:
+    """
+    Параллельное скачивание выгрузок через общую HTTP‑сессию.
+    submit() сразу ставит файл в очередь пула и возвращает Future с путём к нему,
+    поэтому вызывающий код может обрабатывать файлы в исходном порядке,
+    пока следующие ещё качаются.
+    """
+
+    def __init__(self, session: requests.Session, download_dir: Path, config: Dict[str, Any]):
+        self.session = session
+        self.download_dir = download_dir
+        self.settings = http_download_settings(config)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings["max_workers"],
+            thread_name_prefix="export-download",
+        )
+
+    def submit(self, url: str, fallback_name: str) -> "Future[Path]":
+        return self._executor.submit(
+            download_file,
+            self.session,
+            url,
+            self.download_dir,
+            fallback_name,
+            self.settings["timeout"],
+            self.settings["chunk_size"],
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
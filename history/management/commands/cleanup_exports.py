@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from history.services import cleanup_export_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет фоновые выгрузки (ExportJob) старше HISTORY_EXPORT_TTL_DAYS дней "
+        "и их файлы, если на файл не ссылается ни одна оставшаяся выгрузка."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            dest="days",
+            type=int,
+            default=None,
+            help="Срок хранения в днях (по умолчанию HISTORY_EXPORT_TTL_DAYS).",
+        )
+
+    def handle(self, *args, **options):
+        jobs, files = cleanup_export_jobs(options.get("days"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Очистка выгрузок завершена. Удалено записей: {jobs}, файлов: {files}."
+            )
+        )
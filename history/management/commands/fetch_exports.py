@@ -1,10 +1,10 @@
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
-from history.scraper import ExportItem, run_scraper
-from history.services import import_from_file
-from history.models import ImportHistory
+from history.scraper import ExportItem, ExportPipeline, run_scraper
+from history.services import ImportedSnapshots, import_from_file
 
 
 class Command(BaseCommand):
@@ -27,24 +27,51 @@ class Command(BaseCommand):
             default=None,
             help="Ограничить количество импортируемых выгрузок за один запуск.",
         )
+        parser.add_argument(
+            "--incremental",
+            dest="incremental",
+            action="store_true",
+            help=(
+                "Прокручивать историю выгрузок только до серии уже импортированных срезов "
+                "подряд (browser.incremental_stop_after, по умолчанию 5) — для регулярных "
+                "запусков. Пропуски ниже этой серии подбирает только периодический полный запуск."
+            ),
+        )
+        parser.add_argument(
+            "--pipeline",
+            dest="pipeline",
+            action="store_true",
+            help=(
+                "Импортировать выгрузки в отдельном потоке, пока скачиваются следующие "
+                "(порядок импорта сохраняется)."
+            ),
+        )
+        parser.add_argument(
+            "--queue-size",
+            dest="queue_size",
+            type=int,
+            default=2,
+            help="Сколько скачанных, но ещё не импортированных файлов может ждать в очереди (для --pipeline).",
+        )
 
     def handle(self, *args, **options):
         config_path = options["config"]
         limit = options["limit"]
+        use_pipeline = options.get("pipeline", False) and limit is None
 
         self.stdout.write(self.style.NOTICE(f"Используется конфиг: {config_path}"))
 
         total_created = 0
         total_updated = 0
 
+        # Уже импортированные срезы — одним запросом на весь запуск.
+        # Проверяем только по дате среза, т.к. в истории теперь храним
+        # реальное имя файла, а не текст из интерфейса Атласа.
+        imported = ImportedSnapshots()
+
         def should_download(title: str, snapshot_dt):
             # Пропускаем срезы, которые уже есть в истории импорта.
-            # Проверяем только по дате среза, т.к. в истории теперь храним
-            # реальное имя файла, а не текст из интерфейса Атласа.
-            exists = ImportHistory.objects.filter(
-                snapshot_dt=snapshot_dt
-            ).exists()
-            if exists:
+            if imported.contains(snapshot_dt):
                 self.stdout.write(
                     self.style.WARNING(
                         f"Пропуск среза {snapshot_dt:%d.%m.%Y %H:%M} ({title}) — уже импортирован."
@@ -73,6 +100,7 @@ class Command(BaseCommand):
                 )
                 return
 
+            imported.add(item.snapshot_dt)
             total_created += created
             total_updated += updated
 
@@ -92,16 +120,40 @@ class Command(BaseCommand):
                 )
             )
 
-        try:
-            exports = run_scraper(
-                config_path=config_path,
-                should_download=(
-                    (lambda title, dt: should_download(title, dt))
-                    if limit is None
-                    else None
-                ),
-                on_export=on_export if limit is None else None,
+        # В режиме --pipeline импорт идёт в отдельном потоке; его соединение с БД
+        # закрываем там же по завершении.
+        pipeline = None
+        if use_pipeline:
+            pipeline = ExportPipeline(
+                on_export,
+                maxsize=options.get("queue_size", 2),
+                on_exit=connections.close_all,
             )
+
+        try:
+            try:
+                exports = run_scraper(
+                    config_path=config_path,
+                    should_download=(
+                        (lambda title, dt: should_download(title, dt))
+                        if limit is None
+                        else None
+                    ),
+                    on_export=(
+                        (pipeline.put if pipeline is not None else on_export)
+                        if limit is None
+                        else None
+                    ),
+                    is_imported=(
+                        imported.contains
+                        if options.get("incremental")
+                        else None
+                    ),
+                )
+            finally:
+                # Дожидаемся импорта уже скачанных файлов, даже если скрапер упал
+                if pipeline is not None:
+                    pipeline.close()
         except FileNotFoundError as exc:
             raise CommandError(str(exc)) from exc
         except Exception as exc:  # noqa: BLE001
@@ -25,10 +25,10 @@ class Command(BaseCommand):
         self.stdout.write(self.style.NOTICE(f"Используется конфиг: {config_path}"))
 
         def should_download(title: str, snapshot_dt):
-            exists = ImportHistory.objects.filter(
-                snapshot_dt=snapshot_dt, filename=title
-            ).exists()
-            if exists:
+            # Скачивается одна выгрузка — достаточно одного запроса.
+            # Проверяем только по дате среза (как и import_from_file): в истории
+            # хранится реальное имя файла, а не текст из интерфейса Атласа.
+            if ImportHistory.objects.filter(snapshot_dt=snapshot_dt).exists():
                 self.stdout.write(
                     self.style.WARNING(
                         f"Пропуск среза {snapshot_dt:%d.%m.%Y %H:%M} ({title}) — уже импортирован."
@@ -1,7 +1,9 @@
 from datetime import datetime
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from history.caching import bump_data_version
 from history.models import Application
 
 
@@ -24,37 +26,45 @@ class Command(BaseCommand):
             )
         )
 
-        for app in Application.objects.iterator():
-            updates = {}
+        # Одна транзакция: ревизия заблокирована до коммита, поэтому правки
+        # не окажутся в change feed «позади» более поздних изменений
+        revision = None
+        with transaction.atomic():
+            for app in Application.objects.iterator():
+                updates = {}
 
-            for field in fields:
-                value = getattr(app, field)
-                if not value:
-                    continue
+                for field in fields:
+                    value = getattr(app, field)
+                    if not value:
+                        continue
 
-                # Интересуют только двусмысленные случаи, когда и день, и месяц в диапазоне 1–12.
-                day = value.day
-                month = value.month
-                if not (1 <= day <= 12 and 1 <= month <= 12):
-                    continue
+                    # Интересуют только двусмысленные случаи, когда и день, и месяц в диапазоне 1–12.
+                    day = value.day
+                    month = value.month
+                    if not (1 <= day <= 12 and 1 <= month <= 12):
+                        continue
 
-                # Предполагаем, что исходная строка была dd.mm.YYYY, но распарсилась как mm.dd.YYYY.
-                # Чтобы восстановить её, форматируем как mm.dd.YYYY и заново парсим как dd.mm.YYYY.
-                s = value.strftime("%m.%d.%Y")  # то, что было бы исходной строкой dd.mm.YYYY
-                try:
-                    corrected = datetime.strptime(s, "%d.%m.%Y").date()
-                except ValueError:
-                    # Если такая дата невозможна, оставляем как есть.
-                    continue
+                    # Предполагаем, что исходная строка была dd.mm.YYYY, но распарсилась как mm.dd.YYYY.
+                    # Чтобы восстановить её, форматируем как mm.dd.YYYY и заново парсим как dd.mm.YYYY.
+                    s = value.strftime("%m.%d.%Y")  # то, что было бы исходной строкой dd.mm.YYYY
+                    try:
+                        corrected = datetime.strptime(s, "%d.%m.%Y").date()
+                    except ValueError:
+                        # Если такая дата невозможна, оставляем как есть.
+                        continue
 
-                if corrected != value:
-                    updates[field] = corrected
+                    if corrected != value:
+                        updates[field] = corrected
 
-            if updates:
-                for f, v in updates.items():
-                    setattr(app, f, v)
-                app.save(update_fields=list(updates.keys()))
-                fixed += 1
+                if updates:
+                    for f, v in updates.items():
+                        setattr(app, f, v)
+                    # Правка попадает в change feed под новой ревизией данных
+                    if revision is None:
+                        revision = bump_data_version()
+                    app.change_version = revision
+                    app.save(update_fields=[*updates, "change_version"])
+                    fixed += 1
 
         self.stdout.write(
             self.style.SUCCESS(
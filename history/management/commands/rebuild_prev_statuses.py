@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from history.caching import bump_data_version
 from history.models import Application, StatusHistory
 
 
@@ -16,39 +18,47 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.NOTICE(f"Найдено заявок: {total}. Начинаю пересчёт..."))
 
-        for app in Application.objects.iterator():
-            current_atlas = app.current_atlas_status
-            current_rr = app.current_rr_status
+        # Одна транзакция: ревизия заблокирована до коммита, поэтому правки
+        # не окажутся в change feed «позади» более поздних изменений
+        revision = None
+        with transaction.atomic():
+            for app in Application.objects.iterator():
+                current_atlas = app.current_atlas_status
+                current_rr = app.current_rr_status
 
-            # Ищем последний статус Атлас, отличный от текущего
-            prev_atlas = (
-                StatusHistory.objects.filter(
-                    application=app,
-                    atlas_status__isnull=False,
+                # Ищем последний статус Атлас, отличный от текущего
+                prev_atlas = (
+                    StatusHistory.objects.filter(
+                        application=app,
+                        atlas_status__isnull=False,
+                    )
+                    .exclude(atlas_status=current_atlas)
+                    .order_by("-snapshot_dt")
+                    .values_list("atlas_status", flat=True)
+                    .first()
                 )
-                .exclude(atlas_status=current_atlas)
-                .order_by("-snapshot_dt")
-                .values_list("atlas_status", flat=True)
-                .first()
-            )
 
-            # Ищем последний статус РР, отличный от текущего
-            prev_rr = (
-                StatusHistory.objects.filter(
-                    application=app,
-                    rr_status__isnull=False,
+                # Ищем последний статус РР, отличный от текущего
+                prev_rr = (
+                    StatusHistory.objects.filter(
+                        application=app,
+                        rr_status__isnull=False,
+                    )
+                    .exclude(rr_status=current_rr)
+                    .order_by("-snapshot_dt")
+                    .values_list("rr_status", flat=True)
+                    .first()
                 )
-                .exclude(rr_status=current_rr)
-                .order_by("-snapshot_dt")
-                .values_list("rr_status", flat=True)
-                .first()
-            )
 
-            if app.prev_atlas_status != prev_atlas or app.prev_rr_status != prev_rr:
-                app.prev_atlas_status = prev_atlas
-                app.prev_rr_status = prev_rr
-                app.save(update_fields=["prev_atlas_status", "prev_rr_status"])
-                updated += 1
+                if app.prev_atlas_status != prev_atlas or app.prev_rr_status != prev_rr:
+                    app.prev_atlas_status = prev_atlas
+                    app.prev_rr_status = prev_rr
+                    # Правка попадает в change feed под новой ревизией данных
+                    if revision is None:
+                        revision = bump_data_version()
+                    app.change_version = revision
+                    app.save(update_fields=["prev_atlas_status", "prev_rr_status", "change_version"])
+                    updated += 1
 
         self.stdout.write(
             self.style.SUCCESS(
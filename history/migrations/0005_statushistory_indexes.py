@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0004_application_lms_application_atlas_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='statushistory',
+            index=models.Index(fields=['application', '-snapshot_dt'], name='statushistory_app_snap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statushistory',
+            index=models.Index(fields=['snapshot_dt'], name='statushistory_snapshot_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0005_statushistory_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('params', models.JSONField(default=dict, verbose_name='Параметры фильтров')),
+                ('export_format', models.CharField(default='xlsx', max_length=20, verbose_name='Формат')),
+                ('data_version', models.PositiveIntegerField(default=0, verbose_name='Версия данных')),
+                ('cache_key', models.CharField(db_index=True, max_length=255, verbose_name='Ключ выгрузки')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Формируется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('notified', models.BooleanField(default=False, verbose_name='Пользователь уведомлён')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Фоновая выгрузка',
+                'verbose_name_plural': 'Фоновые выгрузки',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0006_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='columns',
+            field=models.JSONField(blank=True, default=list, verbose_name='Колонки (пусто — все)'),
+        ),
+    ]
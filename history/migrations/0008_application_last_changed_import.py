@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_last_changed_import(apps, schema_editor):
+    """
+    Для существующих заявок момент последнего изменения неизвестен, поэтому
+    считаем их изменёнными в последнем импорте — клиенты change feed,
+    синхронизированные раньше, просто перечитают их один раз.
+    """
+    Application = apps.get_model('history', 'Application')
+    ImportHistory = apps.get_model('history', 'ImportHistory')
+    last_id = ImportHistory.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last_id is not None:
+        Application.objects.update(last_changed_import_id=last_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0007_exportjob_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='last_changed_import',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='history.importhistory', verbose_name='Импорт последнего изменения'),
+        ),
+        migrations.RunPython(backfill_last_changed_import, migrations.RunPython.noop),
+    ]
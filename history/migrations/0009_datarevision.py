@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-19 09:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_revision_row(apps, schema_editor):
+    """
+    Начинаем ревизию с id последнего импорта, чтобы она не совпала
+    с версиями, которые клиенты уже получили в ETag.
+    """
+    DataRevision = apps.get_model('history', 'DataRevision')
+    ImportHistory = apps.get_model('history', 'ImportHistory')
+    last_id = ImportHistory.objects.order_by('-pk').values_list('pk', flat=True).first()
+    DataRevision.objects.get_or_create(pk=1, defaults={'revision': last_id or 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0008_application_last_changed_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveBigIntegerField(default=0, verbose_name='Ревизия')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Ревизия данных',
+                'verbose_name_plural': 'Ревизия данных',
+            },
+        ),
+        migrations.RunPython(create_revision_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:47
+
+import history.models
+from django.db import migrations, models
+
+
+def backfill_change_version(apps, schema_editor):
+    """
+    Версией уже синхронизированных строк остаётся id импорта: клиенты,
+    сохранившие прежний version как курсор, продолжат с того же места
+    (ревизия данных стартует с id последнего импорта, см. 0009).
+    """
+    Application = apps.get_model('history', 'Application')
+    Application.objects.filter(last_changed_import__isnull=False).update(
+        change_version=models.F('last_changed_import_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0009_datarevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='change_version',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, verbose_name='Версия изменения'),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='last_changed_import',
+            field=models.ForeignKey(blank=True, null=True, on_delete=history.models.set_previous_import, related_name='+', to='history.importhistory', verbose_name='Импорт последнего изменения'),
+        ),
+        migrations.RunPython(backfill_change_version, migrations.RunPython.noop),
+    ]
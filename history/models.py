@@ -1,7 +1,30 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
 
+def set_previous_import(collector, field, sub_objs, using):
+    """
+    on_delete для Application.last_changed_import: вместо NULL ставит
+    предыдущий (не удаляемый) импорт, чтобы ссылка оставалась осмысленной.
+    """
+    deleted_ids = {obj.pk for obj in collector.data.get(ImportHistory, ())}
+    import_ids = sub_objs.order_by().values_list('last_changed_import_id', flat=True).distinct()
+    for import_id in list(import_ids):
+        previous = (
+            ImportHistory.objects.using(using)
+            .filter(pk__lt=import_id)
+            .exclude(pk__in=deleted_ids)
+            .order_by('-pk')
+            .first()
+        )
+        collector.add_field_update(
+            field,
+            previous,
+            sub_objs.filter(last_changed_import_id=import_id),
+        )
+
+
 class Application(models.Model):
     rr_id = models.CharField(max_length=255, unique=True, verbose_name="ID заявки из РР")
     
@@ -43,6 +66,24 @@ class Application(models.Model):
     rr_application = models.CharField(max_length=255, verbose_name="Номер заявления на РР", blank=True, null=True)
     employment = models.BooleanField(verbose_name="Трудоустройство", default=False)
 
+    # Импорт, в котором данные или статусы заявки изменились в последний раз
+    # (ставит импортёр). При удалении импорта ссылка переходит на предыдущий.
+    last_changed_import = models.ForeignKey(
+        'ImportHistory',
+        on_delete=set_previous_import,
+        related_name='+',
+        blank=True,
+        null=True,
+        verbose_name="Импорт последнего изменения",
+    )
+    # Версия строки для change feed (?since_version=): ревизия DataRevision,
+    # при которой заявка менялась последний раз. Ставится всеми путями записи —
+    # импортом, админкой и командами, — поэтому строго растёт в порядке коммитов.
+    change_version = models.PositiveBigIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name="Версия изменения",
+    )
 
     def __str__(self):
         return f"{self.last_name} {self.first_name} ({self.rr_id})"
@@ -64,6 +105,12 @@ class StatusHistory(models.Model):
         verbose_name = "История статуса"
         verbose_name_plural = "История статусов"
         ordering = ['-snapshot_dt']
+        indexes = [
+            # Состояние заявки на момент среза (последняя запись <= даты)
+            models.Index(fields=['application', '-snapshot_dt'], name='statushistory_app_snap_idx'),
+            # Изменения в интервале между срезами
+            models.Index(fields=['snapshot_dt'], name='statushistory_snapshot_idx'),
+        ]
 
 class ImportHistory(models.Model):
     filename = models.CharField(max_length=255, verbose_name="Имя файла")
@@ -81,6 +128,26 @@ class ImportHistory(models.Model):
         return f"{self.filename} ({self.snapshot_dt})"
 
 
+class DataRevision(models.Model):
+    """
+    Единственная строка с ревизией данных. Увеличивается при каждом изменении
+    заявок или истории (импорт, админка, команды) в той же транзакции, что и
+    само изменение. Ревизия входит в ключи кэша и ETag API, и, поскольку она
+    хранится в БД, её видят все процессы.
+    """
+    SINGLETON_PK = 1
+
+    revision = models.PositiveBigIntegerField(default=0, verbose_name="Ревизия")
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name="Время изменения")
+
+    class Meta:
+        verbose_name = "Ревизия данных"
+        verbose_name_plural = "Ревизия данных"
+
+    def __str__(self):
+        return f"Ревизия {self.revision} ({self.changed_at})"
+
+
 class ExportSchedule(models.Model):
     """
     Настройка периодического запуска команды fetch_latest_export.
@@ -180,3 +247,50 @@ class ExportSchedule(models.Model):
             previous_enabled is False and self.enabled is True
         ):
             run_export_schedule.delay(self.pk)
+
+
+class ExportJob(models.Model):
+    """
+    Фоновая выгрузка списка заявок (Celery‑задача build_export_file).
+
+    Готовый файл хранится в default storage. Одинаковые запросы
+    (те же фильтры, формат и версия данных) переиспользуют готовый файл
+    по cache_key.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "В очереди"),
+        (STATUS_RUNNING, "Формируется"),
+        (STATUS_DONE, "Готово"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name="Пользователь",
+    )
+    params = models.JSONField("Параметры фильтров", default=dict)
+    export_format = models.CharField("Формат", max_length=20, default="xlsx")
+    columns = models.JSONField("Колонки (пусто — все)", default=list, blank=True)
+    data_version = models.PositiveIntegerField("Версия данных", default=0)
+    cache_key = models.CharField("Ключ выгрузки", max_length=255, db_index=True)
+    status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    file = models.FileField("Файл", upload_to="exports/", blank=True)
+    error = models.TextField("Ошибка", blank=True)
+    notified = models.BooleanField("Пользователь уведомлён", default=False)
+    created_at = models.DateTimeField("Создано", auto_now_add=True)
+    finished_at = models.DateTimeField("Завершено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая выгрузка"
+        verbose_name_plural = "Фоновые выгрузки"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.export_format} ({self.created_at:%d.%m.%Y %H:%M})"
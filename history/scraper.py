@@ -1,9 +1,14 @@
+import json
+import os
+import queue
+import threading
 import time
 import re
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
 
 import yaml
 from selenium import webdriver
@@ -16,6 +21,9 @@ from selenium.webdriver.edge.service import Service as EdgeService
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
 
+from .download_watcher import DownloadWatcher
+from .downloader import ExportDownloader, http_download_settings, resolve_download_url, session_from_driver
+
 
 @dataclass
 class ExportItem:
@@ -24,6 +32,67 @@ class ExportItem:
     file_path: Path
 
 
+class ExportPipeline:
+    """
+    Конвейер «скачивание → импорт»: скачанные выгрузки кладутся в ограниченную
+    очередь (put), а отдельный поток по одной передаёт их в consumer в том же
+    порядке. Браузер не простаивает, пока идёт импорт, а импорт — пока качается
+    следующий файл; maxsize ограничивает число скачанных, но ещё не импортированных файлов.
+
+    Ошибка consumer останавливает конвейер и пробрасывается из put()/close().
+    on_exit вызывается в потоке‑обработчике перед его завершением
+    (например, чтобы закрыть соединение с БД этого потока).
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        consumer: Callable[[ExportItem], None],
+        maxsize: int = 2,
+        on_exit: Optional[Callable[[], None]] = None,
+    ):
+        self._consumer = consumer
+        self._on_exit = on_exit
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(maxsize, 1))
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="export-importer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    return
+                if self._error is not None:
+                    # После ошибки только вычерпываем очередь, чтобы put() не блокировался
+                    continue
+                try:
+                    self._consumer(item)
+                except BaseException as exc:  # noqa: BLE001
+                    self._error = exc
+        finally:
+            if self._on_exit is not None:
+                self._on_exit()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"Ошибка обработки выгрузки: {self._error}") from self._error
+
+    def put(self, item: ExportItem):
+        self._raise_error()
+        self._queue.put(item)
+
+    def close(self):
+        """
+        Дожидается обработки всех поставленных выгрузок и останавливает поток.
+        """
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._raise_error()
+
+
 def load_config(path: str = "scraper_config.yaml") -> Dict[str, Any]:
     """
     Загрузка YAML‑конфига со всеми настройками скрапера.
@@ -230,6 +299,157 @@ def login(driver, config: Dict[str, Any]):
             ) from exc
 
 
+def _session_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = config.get("session", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "state_file": Path(cfg.get("state_file") or ".scraper_session.json"),
+        "check_timeout": float(cfg.get("check_timeout", 5)),
+    }
+
+
+def save_session(driver, config: Dict[str, Any]):
+    """
+    Сохраняет куки и localStorage текущей сессии браузера в session.state_file,
+    чтобы следующий запуск мог обойтись без полного логина.
+    Файл содержит данные авторизации, поэтому доступен только владельцу.
+    """
+    settings = _session_settings(config)
+    if not settings["enabled"]:
+        return
+    try:
+        storage = driver.execute_script("return Object.assign({}, window.localStorage);") or {}
+    except Exception:  # noqa: BLE001
+        storage = {}
+    state = {
+        "saved_at": datetime.now().isoformat(),
+        "cookies": driver.get_cookies(),
+        "local_storage": storage if isinstance(storage, dict) else {},
+    }
+    path = settings["state_file"]
+    tmp_path = path.with_name(path.name + ".tmp")
+    # Остаток упавшего запуска; права 0o600 задаются сразу при создании файла
+    tmp_path.unlink(missing_ok=True)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, ensure_ascii=False)
+    tmp_path.replace(path)
+
+
+def _load_session_state(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return state if state.get("cookies") else None
+
+
+def _cdp_cookie(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Кука из driver.get_cookies() в формате CookieParam для Network.setCookies.
+    """
+    param = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly") if key in cookie}
+    if "expiry" in cookie:
+        param["expires"] = cookie["expiry"]
+    if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+        param["sameSite"] = cookie["sameSite"]
+    return param
+
+
+SET_LOCAL_STORAGE_SCRIPT = (
+    "for (const [k, v] of Object.entries(arguments[0])) window.localStorage.setItem(k, v);"
+)
+
+
+def _restore_browser_state(driver, state: Dict[str, Any], origin_url: str) -> Optional[str]:
+    """
+    Возвращает в браузер куки и localStorage сохранённой сессии до загрузки
+    рабочей страницы, чтобы она открылась один раз и уже авторизованной.
+
+    Через CDP (Chrome/Edge) куки ставятся без загрузки страницы, а localStorage
+    заполняет скрипт, который браузер выполнит до скриптов сайта при первой
+    загрузке страницы этого origin; возвращается его identifier — после
+    загрузки скрипт нужно снять. Иначе открываем origin, добавляем куки
+    стандартным add_cookie и заполняем localStorage на нём.
+    """
+    cookies = state["cookies"]
+    storage = state.get("local_storage") or {}
+    if hasattr(driver, "execute_cdp_cmd"):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [_cdp_cookie(c) for c in cookies]})
+        if not storage:
+            return None
+        source = (
+            f"if (window.location.origin === {json.dumps(origin_url.rstrip('/'))}) {{"
+            f" const items = {json.dumps(storage, ensure_ascii=False)};"
+            " for (const [k, v] of Object.entries(items)) window.localStorage.setItem(k, v); }"
+        )
+        result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})
+        return result.get("identifier") if isinstance(result, dict) else None
+
+    driver.get(origin_url)
+    for cookie in cookies:
+        driver.add_cookie({key: value for key, value in cookie.items() if key != "expiry" or isinstance(value, int)})
+    if storage:
+        driver.execute_script(SET_LOCAL_STORAGE_SCRIPT, storage)
+    return None
+
+
+def _session_is_valid(driver, config: Dict[str, Any]) -> bool:
+    """
+    Проверяет, принял ли сайт восстановленную сессию на открытой странице:
+    ждёт auth.success_selector (или проверяет, что не произошёл редирект на логин).
+    """
+    auth = config.get("auth", {})
+    success_selector = auth.get("success_selector")
+    if success_selector:
+        try:
+            WebDriverWait(driver, _session_settings(config)["check_timeout"]).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, success_selector))
+            )
+        except TimeoutException:
+            return False
+        return True
+
+    login_url = auth.get("login_url") or ""
+    return not (login_url and driver.current_url.startswith(login_url))
+
+
+def restore_session_or_login(driver, config: Dict[str, Any]) -> bool:
+    """
+    Восстанавливает сохранённую сессию (куки + localStorage) и проверяет её;
+    если сессии нет или сайт её не принял — выполняет полный login().
+    Возвращает True, если удалось обойтись без логина.
+    """
+    settings = _session_settings(config)
+    state = _load_session_state(settings["state_file"]) if settings["enabled"] else None
+
+    if state is not None:
+        auth = config.get("auth", {})
+        start_url = config.get("pages", {}).get("export_page_url") or auth.get("login_url")
+        parsed = urlparse(start_url or "")
+        script_id = _restore_browser_state(driver, state, f"{parsed.scheme}://{parsed.netloc}/")
+
+        driver.get(start_url)
+        if script_id:
+            # localStorage уже заполнен — дальнейшие переходы его не перезаписывают
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script_id})
+
+        if _session_is_valid(driver, config):
+            print("[scraper] Сохранённая сессия принята, логин не требуется.")
+            return True
+
+        print("[scraper] Сохранённая сессия не принята сайтом, выполняем полный логин.")
+        driver.delete_all_cookies()
+        settings["state_file"].unlink(missing_ok=True)
+
+    login(driver, config)
+    save_session(driver, config)
+    return False
+
+
 def open_export_modal(driver, config: Dict[str, Any]):
     pages = config.get("pages", {})
     export_url = pages.get("export_page_url")
@@ -240,7 +460,9 @@ def open_export_modal(driver, config: Dict[str, Any]):
     if not export_url or not export_link_text or not modal_selector:
         raise ValueError("В конфиге pages должны быть заданы export_page_url, export_link_text и modal_selector.")
 
-    driver.get(export_url)
+    # Восстановление сессии уже открыло эту страницу — не загружаем её повторно
+    if driver.current_url != export_url:
+        driver.get(export_url)
     wait = WebDriverWait(
         driver, int(config.get("browser", {}).get("explicit_wait", 20))
     )
@@ -279,7 +501,50 @@ def open_export_modal(driver, config: Dict[str, Any]):
         ) from exc
 
 
-def load_full_history(driver, config: Dict[str, Any]):
+# Тексты всех строк списка выгрузок одним вызовом (arguments: item_selector, item_text_selector)
+ROW_TEXTS_SCRIPT = """
+const [itemSelector, textSelector] = arguments;
+return Array.from(document.querySelectorAll(itemSelector)).map((el) => {
+    const textEl = textSelector ? el.querySelector(textSelector) : null;
+    return (textEl || el).innerText.trim();
+});
+"""
+
+
+# Данные всех строк списка выгрузок одним вызовом: текст, кнопка скачивания
+# (WebElement) и её URL/id для прямого скачивания.
+# arguments: item_selector, item_text_selector, download_button_selector, url_attribute, id_attribute
+ROW_DATA_SCRIPT = """
+const [itemSelector, textSelector, buttonSelector, urlAttribute, idAttribute] = arguments;
+return Array.from(document.querySelectorAll(itemSelector)).map((el) => {
+    const textEl = textSelector ? el.querySelector(textSelector) : null;
+    const button = el.querySelector(buttonSelector);
+    return {
+        text: (textEl || el).innerText.trim(),
+        button: button,
+        url: button ? button.getAttribute(urlAttribute) : null,
+        id: el.getAttribute(idAttribute),
+    };
+});
+"""
+
+
+def load_full_history(
+    driver,
+    config: Dict[str, Any],
+    is_imported: Optional[Callable[[datetime], bool]] = None,
+):
+    """
+    Прокручивает список выгрузок в модалке, пока подгружаются новые строки.
+
+    Инкрементальный режим (передан is_imported): список идёт от новых к старым,
+    поэтому прокрутка останавливается, когда подряд встретились
+    browser.incremental_stop_after уже импортированных срезов (по умолчанию 5).
+    Одиночный импортированный срез не означает, что ниже нет пропусков:
+    fetch_latest_export импортирует только самый новый срез, а полный прогон
+    мог упасть посередине. Пропуски глубже такой серии подберёт только
+    полный прогон без --incremental.
+    """
     modal_cfg = config.get("modal", {})
     list_selector = modal_cfg.get("list_container_selector")
     if not list_selector:
@@ -299,9 +564,40 @@ def load_full_history(driver, config: Dict[str, Any]):
         ) from exc
 
     max_iter = int(config.get("browser", {}).get("max_scroll_iterations", 30))
+    stop_after = max(1, int(config.get("browser", {}).get("incremental_stop_after", 5)))
+    checked_rows = 0
+    imported_run = 0
+
+    def reached_imported() -> bool:
+        nonlocal checked_rows, imported_run
+        if is_imported is None:
+            return False
+        texts = driver.execute_script(
+            ROW_TEXTS_SCRIPT,
+            modal_cfg.get("item_selector"),
+            modal_cfg.get("item_text_selector"),
+        ) or []
+        # Новые строки подгружаются снизу — проверяем только их
+        new_texts, checked_rows = texts[checked_rows:], len(texts)
+        for text in new_texts:
+            try:
+                snapshot_dt = _parse_snapshot_dt(text)
+            except ValueError:
+                continue
+            # Серия прерывается на первом неимпортированном срезе
+            imported_run = imported_run + 1 if is_imported(snapshot_dt) else 0
+            if imported_run >= stop_after:
+                print(
+                    f"[scraper] {imported_run} импортированных срезов подряд (до "
+                    f"{snapshot_dt:%d.%m.%Y %H:%M}) — прокрутка остановлена."
+                )
+                return True
+        return False
 
     last_height = 0
     for _ in range(max_iter):
+        if reached_imported():
+            break
         # Текущая высота
         new_height = driver.execute_script("return arguments[0].scrollHeight", container)
         if new_height == last_height:
@@ -314,31 +610,70 @@ def load_full_history(driver, config: Dict[str, Any]):
 
 def _parse_snapshot_dt(text: str) -> datetime:
     """
-    Извлекает из строки дату/время формата 'ДД.MM.ГГГГ, ЧЧ:ММ'.
+    Извлекает из строки дату/время формата 'ДД.MM.ГГГГ, ЧЧ:ММ'
+    (дата и время могут быть в разных строках ячейки).
     Если парсинг не удался — бросает ValueError.
     """
-    m = re.search(r"(\d{2}\.\d{2}\.\d{4}).*?(\d{2}:\d{2})", text)
+    m = re.search(r"(\d{2}\.\d{2}\.\d{4}).*?(\d{2}:\d{2})", text, re.S)
     if not m:
         raise ValueError(f"Не удалось распарсить дату/время из текста: {text!r}")
     date_part, time_part = m.groups()
     return datetime.strptime(f"{date_part} {time_part}", "%d.%m.%Y %H:%M")
 
 
+def _download_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    browser_cfg = config.get("browser", {})
+    return {
+        "timeout": int(browser_cfg.get("download_timeout", 60)),
+    }
+
+
+def _new_export_wait_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ожидание новой выгрузки (секция new_export_wait конфига): общий дедлайн
+    и интервалы опроса, растущие в factor раз от initial_interval до max_interval.
+    """
+    cfg = config.get("new_export_wait", {}) or {}
+    return {
+        "timeout": float(cfg.get("timeout", 300)),
+        "initial_interval": max(float(cfg.get("initial_interval", 0.5)), 0.01),
+        "max_interval": max(float(cfg.get("max_interval", 10)), 0.01),
+        "factor": max(float(cfg.get("factor", 2)), 1.0),
+    }
+
+
+def _wait_with_backoff(condition: Callable[[], Any], deadline: float, settings: Dict[str, Any]):
+    """
+    Вызывает condition(), пока он не вернёт непустое значение, с экспоненциально
+    растущими паузами между попытками. deadline — момент по time.monotonic().
+    Возвращает результат condition() или None, если дедлайн истёк.
+    Протухшие элементы (stale) считаются неудачной попыткой.
+    """
+    interval = settings["initial_interval"]
+    while True:
+        try:
+            result = condition()
+        except StaleElementReferenceException:
+            result = None
+        if result:
+            return result
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * settings["factor"], settings["max_interval"])
+
+
 def _wait_for_new_file(download_dir: Path, before_files, timeout: int = 60) -> Path:
     """
-    Ожидает появления нового .xlsx файла в папке загрузки.
-    """
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        current_files = set(download_dir.glob("*.xlsx"))
-        new_files = current_files - before_files
-        # Игнорируем временные файлы
-        ready_files = {f for f in new_files if not f.name.endswith(".crdownload") and not f.name.endswith(".part")}
-        if ready_files:
-            # Возвращаем любой (обычно один)
-            return sorted(ready_files, key=lambda p: p.stat().st_mtime)[-1]
-        time.sleep(1.0)
-    raise TimeoutError("Не удалось дождаться загрузки файла экспорта.")
+    Ожидает появления нового полностью записанного .xlsx файла в папке загрузки
+    (события файловой системы, проверка размера и zip‑архива — см. DownloadWatcher).
+    """
+    watcher = DownloadWatcher(download_dir, baseline=before_files)
+    watcher.expect("file")
+    with watcher:
+        return watcher.wait("file", timeout)
 
 
 def collect_and_download_exports(
@@ -375,62 +710,103 @@ def collect_and_download_exports(
             f"при сборе файлов. modal.list_container_selector={list_selector!r}."
         ) from exc
 
-    items: Iterable[Any] = driver.find_elements(By.CSS_SELECTOR, item_selector)
+    # Тексты строк, кнопки скачивания и их URL/id — одним вызовом execute_script,
+    # без find_element и повторов на каждую строку.
+    http_settings = http_download_settings(config)
+    rows: Iterable[Dict[str, Any]] = driver.execute_script(
+        ROW_DATA_SCRIPT,
+        item_selector,
+        text_selector,
+        download_selector,
+        http_settings["url_attribute"],
+        http_settings["id_attribute"],
+    ) or []
 
     # Обходим элементы в обратном порядке (от старых к новым),
     # чтобы история импортировалась хронологически.
-    items = list(items)[::-1]
+    rows = list(rows)[::-1]
     results: List[ExportItem] = []
 
-    # Множество уже существующих файлов, чтобы отследить новые
-    existing_files = set(download_dir.glob("*.xlsx"))
+    download_settings = _download_settings(config)
 
-    for item in items:
-        # Текст, содержащий дату/время. Элемент может «протухать» (stale),
-        # поэтому пытаемся перечитать его несколько раз.
-        retries = 3
-        text = ""
-        while retries > 0:
-            try:
-                text_el = item.find_element(By.CSS_SELECTOR, text_selector)
-                text = text_el.text.strip()
-                break
-            except StaleElementReferenceException:
-                retries -= 1
-                time.sleep(0.5)
-        if not text:
-            print("[scraper] Пропуск элемента выгрузки: не удалось прочитать текст (stale).")
-            continue
+    # Прямое скачивание по HTTP: куки браузера передаются в пул HTTP‑соединений,
+    # файлы качаются параллельно, а обрабатываются (on_export) в исходном порядке.
+    downloader = None
+    if http_settings["enabled"]:
+        downloader = ExportDownloader(session_from_driver(driver, config), download_dir, config)
 
-        try:
-            snapshot_dt = _parse_snapshot_dt(text)
-        except ValueError:
-            print(f"[scraper] Не удалось распарсить дату/время из строки: {text!r}")
-            continue
-
-        title = text
+    # Загрузки через браузер — строго по одной: браузер создаёт файл, когда сервер
+    # начал отвечать, а не в момент клика, поэтому при нескольких одновременных
+    # загрузках файл нельзя надёжно связать со строкой (и с её snapshot_dt).
+    watcher = DownloadWatcher(download_dir).start()
 
-        # Если передан колбэк проверки, спрашиваем, нужно ли скачивать этот срез
-        if should_download is not None and not should_download(title, snapshot_dt):
-            continue
+    # (title, snapshot_dt, функция получения пути, загрузка через браузер?) в исходном порядке
+    pending: List[tuple] = []
 
-        # Кнопка скачивания
-        download_btn = item.find_element(By.CSS_SELECTOR, download_selector)
-        before_files = set(download_dir.glob("*.xlsx"))
-        before_files |= existing_files
-
-        download_btn.click()
-
-        file_path = _wait_for_new_file(download_dir, before_files)
-        existing_files.add(file_path)
-
-        export_item = ExportItem(title=title, snapshot_dt=snapshot_dt, file_path=file_path)
+    def finish_next():
+        title, snapshot_dt, get_path, _ = pending.pop(0)
+        export_item = ExportItem(title=title, snapshot_dt=snapshot_dt, file_path=get_path())
         results.append(export_item)
 
         # Если передан колбэк обработки — вызываем его сразу после загрузки файла
         if on_export is not None:
             on_export(export_item)
 
+    try:
+        for row in rows:
+            text = (row.get("text") or "").strip()
+            if not text:
+                print("[scraper] Пропуск элемента выгрузки: пустой текст строки.")
+                continue
+
+            try:
+                snapshot_dt = _parse_snapshot_dt(text)
+            except ValueError:
+                print(f"[scraper] Не удалось распарсить дату/время из строки: {text!r}")
+                continue
+
+            title = text
+
+            # Если передан колбэк проверки, спрашиваем, нужно ли скачивать этот срез
+            if should_download is not None and not should_download(title, snapshot_dt):
+                continue
+
+            # Кнопка скачивания (WebElement из того же вызова execute_script)
+            download_btn = row.get("button")
+            if download_btn is None:
+                print(f"[scraper] Пропуск {title!r}: не найдена кнопка скачивания ({download_selector!r}).")
+                continue
+
+            if downloader is not None:
+                url = resolve_download_url(row.get("url"), row.get("id"), driver.current_url, config)
+                if url is not None:
+                    future = downloader.submit(url, f"export_{snapshot_dt:%Y%m%d_%H%M}.xlsx")
+                    pending.append((title, snapshot_dt, future.result, False))
+                    continue
+                print(f"[scraper] Не удалось определить URL файла для {title!r} — скачивание через браузер.")
+
+            # Перед следующим кликом дожидаемся предыдущей загрузки через браузер
+            # (и всех более старых, сохраняя хронологический порядок).
+            while any(entry[3] for entry in pending):
+                finish_next()
+
+            key = object()
+            watcher.expect(key)
+            download_btn.click()
+            pending.append((
+                title,
+                snapshot_dt,
+                lambda key=key: watcher.wait(key, download_settings["timeout"]),
+                True,
+            ))
+
+        while pending:
+            finish_next()
+    finally:
+        watcher.stop()
+        if downloader is not None:
+            downloader.close()
+
     return results
 
 
@@ -463,9 +839,21 @@ def create_and_download_latest_export(
         driver, int(config.get("browser", {}).get("explicit_wait", 20))
     )
 
-    # Запоминаем, какие элементы уже есть
-    existing_items = driver.find_elements(By.CSS_SELECTOR, item_selector)
-    existing_texts = {el.text.strip() for el in existing_items if el.text.strip()}
+    http_settings = http_download_settings(config)
+
+    def read_rows() -> List[Dict[str, Any]]:
+        return driver.execute_script(
+            ROW_DATA_SCRIPT,
+            item_selector,
+            text_selector,
+            download_selector,
+            http_settings["url_attribute"],
+            http_settings["id_attribute"],
+        ) or []
+
+    # Запоминаем, какие элементы уже есть — тем же скриптом и с той же нормализацией
+    # текста, что и при поиске новой строки, иначе старая строка может сойти за новую
+    existing_texts = {(row.get("text") or "").strip() for row in read_rows()}
 
     # Нажимаем кнопку "Начать экспорт" внизу модалки
     try:
@@ -480,94 +868,47 @@ def create_and_download_latest_export(
             f"modal.new_export_panel_selector={panel_selector!r}."
         ) from exc
 
-    # Ждём появления нового элемента export-item
-    deadline = time.time() + 300  # максимум 5 минут
-    new_item = None
-    new_text = None
+    # Атлас формирует файл от секунд до минут: опрашиваем список сначала часто,
+    # затем всё реже — в пределах общего дедлайна на появление строки и кнопки.
+    wait_settings = _new_export_wait_settings(config)
+    deadline = time.monotonic() + wait_settings["timeout"]
 
-    while time.time() < deadline:
-        current_items = driver.find_elements(By.CSS_SELECTOR, item_selector)
-        for it in current_items:
-            try:
-                txt = it.text.strip()
-            except StaleElementReferenceException:
-                # Элемент успел протухнуть — пропускаем его и двигаемся дальше.
-                continue
-            if txt and txt not in existing_texts:
-                new_item = it
-                new_text = txt
-                break
-        if new_item is not None:
-            break
-        time.sleep(5)
+    def find_new_text() -> Optional[str]:
+        for row in read_rows():
+            text = (row.get("text") or "").strip()
+            if text and text not in existing_texts:
+                return text
+        return None
 
-    if new_item is None:
+    text = _wait_with_backoff(find_new_text, deadline, wait_settings)
+    if text is None:
         raise TimeoutError("Не удалось дождаться появления новой выгрузки.")
 
-    # Ждём появления кнопки скачивания внутри нового элемента
-    download_btn = None
-    while time.time() < deadline:
-        try:
-            btns = new_item.find_elements(By.CSS_SELECTOR, download_selector)
-        except StaleElementReferenceException:
-            # Элемент мог пересоздаться, ищем его заново по тексту
-            current_items = driver.find_elements(By.CSS_SELECTOR, item_selector)
-            for it in current_items:
-                if it.text.strip() == new_text:
-                    new_item = it
-                    break
-            continue
-
-        for b in btns:
-            if b.is_displayed() and b.is_enabled():
-                download_btn = b
-                break
-
-        if download_btn is not None:
-            break
-
-        time.sleep(5)
+    # Строку ищем заново по тексту на каждой проверке — элемент мог пересоздаться
+    def find_download_button():
+        for row in read_rows():
+            button = row.get("button")
+            if (row.get("text") or "").strip() == text and button is not None:
+                if button.is_displayed() and button.is_enabled():
+                    return button
+        return None
 
+    download_btn = _wait_with_backoff(find_download_button, deadline, wait_settings)
     if download_btn is None:
         raise TimeoutError(
             "Не удалось дождаться кнопки скачивания для новой выгрузки."
         )
 
-    # Обрабатываем только эту новую выгрузку.
-    # Элемент и его текст тоже могут стать "stale", поэтому добавляем защиту.
-    retries = 3
-    text = ""
-    while retries > 0:
-        try:
-            text_el = new_item.find_element(By.CSS_SELECTOR, text_selector)
-            text = text_el.text.strip()
-            break
-        except StaleElementReferenceException:
-            retries -= 1
-            # Переищем new_item по тексту, если он пересоздался
-            current_items = driver.find_elements(By.CSS_SELECTOR, item_selector)
-            for it in current_items:
-                if it.text.strip() == (new_text or ""):
-                    new_item = it
-                    break
-            time.sleep(0.5)
-
-    if not text:
-        raise RuntimeError(
-            "Не удалось прочитать текст новой выгрузки (stale element). "
-            "Попробуйте повторить запуск или уточнить селекторы в конфиге."
-        )
-
     snapshot_dt = _parse_snapshot_dt(text)
     title = text
 
     if should_download is not None and not should_download(title, snapshot_dt):
         return None
 
-    before_files = set(download_dir.glob("*.xlsx"))
-    download_btn.click()
-
-    file_path = _wait_for_new_file(download_dir, before_files)
+    with DownloadWatcher(download_dir) as watcher:
+        watcher.expect(title)
+        download_btn.click()
+        file_path = watcher.wait(title, _download_settings(config)["timeout"])
 
     export_item = ExportItem(title=title, snapshot_dt=snapshot_dt, file_path=file_path)
 
@@ -582,11 +923,13 @@ def run_scraper(
     *,
     should_download: Optional[Callable[[str, datetime], bool]] = None,
     on_export: Optional[Callable[[ExportItem], None]] = None,
+    is_imported: Optional[Callable[[datetime], bool]] = None,
 ) -> List[ExportItem]:
     """
     Режим «bulk»:
     1) логинится;
-    2) открывает модалку экспорта и прокручивает всю историю;
+    2) открывает модалку экспорта и прокручивает всю историю
+       (с is_imported — до серии уже импортированных срезов, см. load_full_history);
     3) скачивает все выгрузки (в порядке от старых к новым) и для каждой
        по желанию вызывает on_export.
     """
@@ -596,11 +939,11 @@ def run_scraper(
 
     try:
         print("[scraper] Шаг 1/3: логин...")
-        login(driver, config)
+        restore_session_or_login(driver, config)
         print("[scraper] Шаг 2/3: открытие страницы экспорта и модального окна...")
         open_export_modal(driver, config)
         print("[scraper] Шаг 3/3: прокрутка истории выгрузок...")
-        load_full_history(driver, config)
+        load_full_history(driver, config, is_imported=is_imported)
         print("[scraper] Сбор списка выгрузок и скачивание файлов...")
         exports = collect_and_download_exports(
             driver,
@@ -609,6 +952,8 @@ def run_scraper(
             should_download=should_download,
             on_export=on_export,
         )
+        # Сайт мог продлить сессию — сохраняем актуальные куки для следующего запуска
+        save_session(driver, config)
     finally:
         driver.quit()
 
@@ -635,7 +980,7 @@ def run_scraper_latest(
 
     try:
         print("[scraper] (latest) Шаг 1/2: логин...")
-        login(driver, config)
+        restore_session_or_login(driver, config)
         print("[scraper] (latest) Шаг 2/2: открытие страницы экспорта и модального окна...")
         open_export_modal(driver, config)
         export_item = create_and_download_latest_export(
@@ -645,6 +990,7 @@ def run_scraper_latest(
             should_download=should_download,
             on_export=on_export,
         )
+        save_session(driver, config)
     finally:
         driver.quit()
 
@@ -1,9 +1,22 @@
+import csv
+import tempfile
+import zlib
 import pandas as pd
 from pathlib import Path
-from .models import Application, StatusHistory, ImportHistory
-from django.db import transaction
-from datetime import datetime
-from django.http import HttpResponse
+from .models import Application, StatusHistory, ImportHistory, ExportJob
+from .caching import bump_data_version, get_data_version, make_cache_key
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from datetime import datetime, timedelta, timezone as dt_timezone
+from collections import Counter
+from itertools import islice
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
 
 
 def _import_dataframe(df, snapshot_dt, filename: str):
@@ -43,6 +56,8 @@ def _import_dataframe(df, snapshot_dt, filename: str):
     
     new_apps = []
     update_apps = []
+    # Заявки, у которых реально изменились данные или статусы (для change feed)
+    changed_apps = []
     history_records = []
     
     # Set of rr_ids in the current file to handle duplicates within file if any (though unlikely for ID)
@@ -174,11 +189,17 @@ def _import_dataframe(df, snapshot_dt, filename: str):
                 app.current_rr_status = new_rr
 
             # Update other fields just in case they changed (optional, but good for consistency)
+            data_changed = status_changed
             for key, value in data.items():
                 if key not in ['current_atlas_status', 'current_rr_status', 'rr_id']: 
+                    # Сравниваем в типах модели: из Excel числа приходят как int/float
+                    if Application._meta.get_field(key).to_python(value) != getattr(app, key):
+                        data_changed = True
                     setattr(app, key, value)
             
             update_apps.append(app)
+            if data_changed:
+                changed_apps.append(app)
             
             if status_changed:
                 history_records.append(StatusHistory(
@@ -194,6 +215,19 @@ def _import_dataframe(df, snapshot_dt, filename: str):
             new_apps.append(app)
 
     with transaction.atomic():
+        # 0. Новая ревизия данных (она же версия изменённых строк для change
+        # feed; строка ревизии заблокирована до коммита) и запись ImportHistory
+        revision = bump_data_version()
+        import_record = ImportHistory.objects.create(
+            filename=filename,
+            snapshot_dt=snapshot_dt,
+            created_count=len(new_apps),
+            updated_count=len(update_apps)
+        )
+        for app in new_apps + changed_apps:
+            app.last_changed_import = import_record
+            app.change_version = revision
+
         # 1. Bulk create new applications
         if new_apps:
             created_apps = Application.objects.bulk_create(new_apps, batch_size=1000)
@@ -206,8 +240,8 @@ def _import_dataframe(df, snapshot_dt, filename: str):
                     snapshot_dt=snapshot_dt
                 ))
 
-        # 2. Bulk update existing applications
-        if update_apps:
+        # 2. Bulk update existing applications (неизменённые строки не трогаем)
+        if changed_apps:
             fields_to_update = [
                 'last_name',
                 'first_name',
@@ -237,22 +271,16 @@ def _import_dataframe(df, snapshot_dt, filename: str):
                 'passport_issued_by',
                 'reg_address',
                 'rr_application',
-                'employment'
+                'employment',
+                'last_changed_import',
+                'change_version',
             ]
-            Application.objects.bulk_update(update_apps, fields_to_update, batch_size=1000)
+            Application.objects.bulk_update(changed_apps, fields_to_update, batch_size=1000)
 
         # 3. Bulk create history records
         if history_records:
             StatusHistory.objects.bulk_create(history_records, batch_size=1000)
             
-        # 4. Create ImportHistory record
-        ImportHistory.objects.create(
-            filename=filename,
-            snapshot_dt=snapshot_dt,
-            created_count=len(new_apps),
-            updated_count=len(update_apps)
-        )
-
     return len(new_apps), len(update_apps)
 
 
@@ -283,6 +311,36 @@ def import_from_file(path, snapshot_dt, title: str | None = None):
     return _import_dataframe(df, snapshot_dt, filename)
 
 
+class ImportedSnapshots:
+    """
+    Уже импортированные срезы, загруженные из ImportHistory одним запросом.
+    Скрапер проверяет по нему каждую строку списка выгрузок без обращения к БД;
+    после успешного импорта срез добавляется через add().
+    Даты хранятся в локальном времени без tzinfo, как их возвращает скрапер.
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self.refresh()
+
+    def refresh(self):
+        self._keys = {
+            self._key(snapshot_dt)
+            for snapshot_dt in ImportHistory.objects.values_list('snapshot_dt', flat=True)
+        }
+
+    def _key(self, snapshot_dt):
+        if timezone.is_aware(snapshot_dt):
+            snapshot_dt = timezone.make_naive(snapshot_dt)
+        return snapshot_dt
+
+    def contains(self, snapshot_dt) -> bool:
+        return self._key(snapshot_dt) in self._keys
+
+    def add(self, snapshot_dt):
+        self._keys.add(self._key(snapshot_dt))
+
+
 def import_data(file, snapshot_dt):
     """
     Обертка для текущей формы импорта (загруженный файл Django).
@@ -299,79 +357,808 @@ def import_data(file, snapshot_dt):
     df = pd.read_excel(file)
     return _import_dataframe(df, snapshot_dt, filename)
 
-def export_to_excel(queryset, selected_date=None):
-    data = []
-    for app in queryset:
-        # Determine which fields to use based on whether we are looking at history (date selected) or current
-        
-        if selected_date:
-            # Queryset is already annotated in view
-            current_atlas = getattr(app, 'hist_atlas_status', None)
-            current_rr = getattr(app, 'hist_rr_status', None)
-            # For historical view, previous status might be tricky to get efficiently without more queries.
-            # Requirement: "предыдущий статус для атлас и рр"
-            # Let's skip "prev" in historical export for simplicity unless strictly required to be historically accurate "prev".
-            # Actually, if we export filtered view, we usually dump what we have.
-            # But let's try to map model fields if no date selected.
-            prev_atlas = None 
-            prev_rr = None
+# Параметры фильтров страницы списка (без пагинации и действий)
+FILTER_PARAMS = (
+    'search',
+    'program',
+    'status_atlas',
+    'status_rr',
+    'prev_status_atlas',
+    'prev_status_rr',
+    'start_date',
+    'end_date',
+    'date',
+)
+
+
+def parse_snapshot_param(value):
+    """
+    Дата/время среза из параметра фильтра `date`.
+    Сначала ISO‑дата+время из выпадающего списка, затем старый формат только с датой.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            return None
+
+
+# Форматы старого параметра snapshot_dt (поиск по вхождению в текст времени среза)
+# и точность, до которой значение задаёт момент времени.
+SNAPSHOT_PREFIX_FORMATS = (
+    ('%Y-%m-%d %H:%M:%S', 'second'),
+    ('%Y-%m-%dT%H:%M:%S', 'second'),
+    ('%Y-%m-%d %H:%M', 'minute'),
+    ('%Y-%m-%dT%H:%M', 'minute'),
+    ('%Y-%m-%d %H', 'hour'),
+    ('%Y-%m-%d', 'day'),
+    ('%Y-%m', 'month'),
+    ('%Y', 'year'),
+)
+
+
+def snapshot_prefix_range(value):
+    """
+    Переводит префикс времени среза (как его понимал фильтр snapshot_dt__contains:
+    текст timestamptz в UTC, например «2025-11-13» или «2025-11-13 08:00»)
+    в полуинтервал [start, end) для запроса по индексу snapshot_dt.
+    Возвращает None, если значение не похоже на префикс даты/времени.
+    """
+    value = (value or '').strip()
+    for fmt, unit in SNAPSHOT_PREFIX_FORMATS:
+        try:
+            start = datetime.strptime(value, fmt).replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+        if unit == 'year':
+            end = start.replace(year=start.year + 1)
+        elif unit == 'month':
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
         else:
-            current_atlas = app.current_atlas_status
-            current_rr = app.current_rr_status
-            prev_atlas = app.prev_atlas_status
-            prev_rr = app.prev_rr_status
-
-        row = {
-            'ID заявки из РР': app.rr_id,
-            'Фамилия': app.last_name,
-            'Имя': app.first_name,
-            'Отчество': app.middle_name,
-            'Email': app.email,
-            'Начало периода обучения': app.start_date,
-            'Окончание периода обучения': app.end_date,
-            'Программа обучения': app.program_name,
-            'Регион': app.region,
-            'Категория гражданина': app.category,
-            'СНИЛС': app.snils,
-            'Дата подачи заявки на РР': app.request_date,
-            'ID программы в заявке': app.program_id,
-            'Текущий Статус Атлас': current_atlas,
-            'Текущий Статус РР': current_rr,
-            'Предыдущий Статус Атлас': prev_atlas,
-            'Предыдущий Статус РР': prev_rr,
-            'Статус заявки в Атлас': app.atlas_status,
-            'Статус заявки в РР': app.rr_status,
-            'Программа в LMS': app.LMS,
-            'Контактная информация': app.contact,
-            'Пол': app.sex,
-            'Дата рождения': app.birthday,
-            'Гражданство': app.contry,
-            'Паспорт': app.passport,
-            'Дата выдачи': app.passport_issued_at,
-            'Кем выдан паспорт': app.passport_issued_by,
-            'Место регистрации': app.reg_address,
-            'Номер заявления на РР': app.rr_application,
-            'Трудоустройство': "Подтверждено" if app.employment == True else "Не подтверждено"
-        }
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-
-    # Принудительно форматируем все даты в человеко‑читаемый вид dd.mm.yyyy,
-    # чтобы в Excel не было ISO‑формата/серийных чисел.
-    date_cols = [
-        'Начало периода обучения',
-        'Окончание периода обучения',
-        'Дата подачи заявки на РР',
+            end = start + timedelta(**{f'{unit}s': 1})
+        return start, end
+    return None
+
+
+def filter_applications(params):
+    """
+    Queryset заявок по параметрам фильтров страницы списка
+    (QueryDict или обычный dict). Используется view и фоновыми выгрузками.
+    Возвращает (queryset, selected_dt).
+    """
+    queryset = Application.objects.all()
+
+    search_query = params.get('search', '')
+    program_filter = params.get('program', '')
+    status_atlas_filter = params.get('status_atlas', '')
+    status_rr_filter = params.get('status_rr', '')
+    prev_status_atlas_filter = params.get('prev_status_atlas', '')
+    prev_status_rr_filter = params.get('prev_status_rr', '')
+    start_date_filter = params.get('start_date', '')
+    end_date_filter = params.get('end_date', '')
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(last_name__icontains=search_query) | 
+            Q(first_name__icontains=search_query) |
+            Q(email__icontains=search_query) |
+            Q(rr_id__icontains=search_query)
+        )
+
+    if program_filter:
+        queryset = queryset.filter(program_name__icontains=program_filter)
+
+    if start_date_filter:
+        queryset = queryset.filter(start_date=start_date_filter)
+
+    if end_date_filter:
+        queryset = queryset.filter(end_date=end_date_filter)
+
+    # Handling Current vs Historical Status Filters
+    selected_dt = parse_snapshot_param(params.get('date', ''))
+
+    if selected_dt:
+        # Subquery: состояние заявки на момент выбранной даты/времени
+        latest_history = StatusHistory.objects.filter(
+            application=OuterRef('pk'),
+            snapshot_dt__lte=selected_dt
+        ).order_by('-snapshot_dt')
+
+        queryset = queryset.annotate(
+            hist_atlas_status=Subquery(latest_history.values('atlas_status')[:1]),
+            hist_rr_status=Subquery(latest_history.values('rr_status')[:1])
+        ).filter(hist_atlas_status__isnull=False)  # Только заявки, уже существовавшие к этому моменту
+
+        if status_atlas_filter:
+            queryset = queryset.filter(hist_atlas_status=status_atlas_filter)
+
+        if status_rr_filter:
+            queryset = queryset.filter(hist_rr_status=status_rr_filter)
+    else:
+        # Standard filtering
+        if status_atlas_filter:
+            queryset = queryset.filter(current_atlas_status=status_atlas_filter)
+
+        if status_rr_filter:
+            queryset = queryset.filter(current_rr_status=status_rr_filter)
+
+        if prev_status_atlas_filter:
+            queryset = queryset.filter(prev_atlas_status=prev_status_atlas_filter)
+
+        if prev_status_rr_filter:
+            queryset = queryset.filter(prev_rr_status=prev_status_rr_filter)
+
+    return queryset, selected_dt
+
+
+def statuses_as_of(snapshot_dt, application_ids=None):
+    """
+    Состояние заявок (atlas_status, rr_status) на момент snapshot_dt.
+
+    Один запрос DISTINCT ON по индексу (application, -snapshot_dt):
+    для каждой заявки берётся последняя запись истории не позже среза.
+    application_ids — опциональный список/подзапрос для ограничения выборки.
+    Возвращает словарь {application_id: (atlas_status, rr_status)}.
+    """
+    history = StatusHistory.objects.filter(snapshot_dt__lte=snapshot_dt)
+    if application_ids is not None:
+        history = history.filter(application_id__in=application_ids)
+    rows = (
+        history
+        .order_by('application_id', '-snapshot_dt')
+        .distinct('application_id')
+        .values_list('application_id', 'atlas_status', 'rr_status')
+    )
+    return {app_id: (atlas, rr) for app_id, atlas, rr in rows}
+
+
+def existing_as_of(queryset, snapshot_dt):
+    """
+    Ограничивает queryset заявками, которые уже были в выгрузках к моменту snapshot_dt
+    (есть хотя бы одна запись истории не позже среза).
+    """
+    return queryset.filter(
+        Exists(StatusHistory.objects.filter(application=OuterRef('pk'), snapshot_dt__lte=snapshot_dt))
+    )
+
+
+def annotate_statuses_as_of(queryset, snapshot_dt):
+    """
+    Заявки, существовавшие к snapshot_dt, со статусами на этот момент
+    (hist_atlas_status, hist_rr_status) — чтобы фильтры по статусу и группировка
+    со срезом работали по статусам среза, а не по текущим.
+    Подзапросы по индексу (application, -snapshot_dt) выполняются, только если
+    аннотации используются в фильтре или выборке.
+    """
+    latest_history = StatusHistory.objects.filter(
+        application=OuterRef('pk'),
+        snapshot_dt__lte=snapshot_dt
+    ).order_by('-snapshot_dt')
+    return existing_as_of(queryset, snapshot_dt).annotate(
+        hist_atlas_status=Subquery(latest_history.values('atlas_status')[:1]),
+        hist_rr_status=Subquery(latest_history.values('rr_status')[:1])
+    )
+
+
+def diff_snapshots(from_import, to_import):
+    """
+    Сравнивает два среза (ImportHistory) и возвращает заявки,
+    у которых отличается статус Атлас и/или РР, и счётчики переходов.
+
+    StatusHistory пишется только при изменении статуса, поэтому кандидаты —
+    заявки с записями истории между двумя срезами; состояние на каждый срез
+    считается одним запросом (см. statuses_as_of), без запросов на строку.
+    """
+    lo, hi = sorted((from_import.snapshot_dt, to_import.snapshot_dt))
+    changed_ids = (
+        StatusHistory.objects
+        .filter(snapshot_dt__gt=lo, snapshot_dt__lte=hi)
+        .values('application_id')
+    )
+    before = statuses_as_of(from_import.snapshot_dt, changed_ids)
+    after = statuses_as_of(to_import.snapshot_dt, changed_ids)
+
+    diffs = {}
+    for app_id in before.keys() | after.keys():
+        old = before.get(app_id, (None, None))
+        new = after.get(app_id, (None, None))
+        if old != new:
+            diffs[app_id] = (old, new)
+
+    apps = Application.objects.filter(pk__in=diffs.keys()).values(
+        'pk', 'rr_id', 'last_name', 'first_name', 'middle_name', 'program_name'
+    )
+
+    changes = []
+    atlas_transitions = Counter()
+    rr_transitions = Counter()
+    for app in apps:
+        (old_atlas, old_rr), (new_atlas, new_rr) = diffs[app.pop('pk')]
+        app.update({
+            'atlas_from': old_atlas,
+            'atlas_to': new_atlas,
+            'rr_from': old_rr,
+            'rr_to': new_rr,
+        })
+        changes.append(app)
+        if old_atlas != new_atlas:
+            atlas_transitions[(old_atlas, new_atlas)] += 1
+        if old_rr != new_rr:
+            rr_transitions[(old_rr, new_rr)] += 1
+
+    changes.sort(key=lambda c: c['rr_id'])
+
+    def transitions(counter):
+        return [
+            {'from': old, 'to': new, 'total': total}
+            for (old, new), total in counter.most_common()
+        ]
+
+    return {
+        'changes': changes,
+        'atlas_transitions': transitions(atlas_transitions),
+        'rr_transitions': transitions(rr_transitions),
+    }
+
+
+# Поля, по которым можно группировать /api/aggregates/
+AGGREGATE_FIELDS = (
+    'current_atlas_status',
+    'current_rr_status',
+    'prev_atlas_status',
+    'prev_rr_status',
+    'program_name',
+    'region',
+    'category',
+)
+
+
+def aggregate_applications(queryset, group_by, snapshot_dt=None):
+    """
+    Количество заявок по комбинациям полей group_by (из AGGREGATE_FIELDS).
+
+    Без среза — один GROUP BY по полям заявки. Со срезом статусы берутся
+    на момент snapshot_dt: текущие — подзапросом по индексу (application, -snapshot_dt),
+    предыдущие — одним проходом previous_statuses_as_of.
+    Возвращает список словарей {поле: значение, ..., 'total': n} по убыванию total.
+    """
+    group_by = list(group_by)
+    if snapshot_dt is None:
+        rows = (
+            queryset
+            .values(*group_by)
+            .annotate(total=Count('pk'))
+            .order_by('-total', *group_by)
+        )
+        return list(rows)
+
+    # Queryset мог быть уже аннотирован (фильтры по статусу на срез)
+    if 'hist_atlas_status' not in queryset.query.annotations:
+        queryset = annotate_statuses_as_of(queryset, snapshot_dt)
+    historical = {
+        'current_atlas_status': 'hist_atlas_status',
+        'current_rr_status': 'hist_rr_status',
+    }
+    prev_fields = [field for field in group_by if field in ('prev_atlas_status', 'prev_rr_status')]
+
+    if not prev_fields:
+        fields = [historical.get(field, field) for field in group_by]
+        rows = queryset.values(*fields).annotate(total=Count('pk')).order_by('-total', *fields)
+        return [
+            {**{field: row[db_field] for field, db_field in zip(group_by, fields)}, 'total': row['total']}
+            for row in rows
+        ]
+
+    # Предыдущие статусы на срез не выражаются в ORM — группируем в Python
+    prev = previous_statuses_as_of(snapshot_dt, queryset)
+    db_fields = [historical.get(field, field) for field in group_by if field not in prev_fields]
+    counter = Counter()
+    for pk, *values in queryset.values_list('pk', *db_fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = dict(zip((f for f in group_by if f not in prev_fields), values))
+        prev_atlas, prev_rr = prev.get(pk, (None, None))
+        row['prev_atlas_status'] = prev_atlas
+        row['prev_rr_status'] = prev_rr
+        counter[tuple(row[field] for field in group_by)] += 1
+    return [
+        {**dict(zip(group_by, key)), 'total': total}
+        for key, total in sorted(counter.items(), key=lambda item: (-item[1], [str(v) for v in item[0]]))
     ]
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = df[col].apply(
-                lambda d: d.strftime('%d.%m.%Y') if pd.notnull(d) else ''
-            )
-    
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=atlas_export_{datetime.now().strftime("%Y%m%d_%H%M")}.xlsx'
-    
-    df.to_excel(response, index=False)
+
+
+# Колонки выгрузки: (заголовок, поле модели). Для исторического среза
+# текущие/предыдущие статусы подменяются в _export_fields.
+EXPORT_COLUMNS = [
+    ('ID заявки из РР', 'rr_id'),
+    ('Фамилия', 'last_name'),
+    ('Имя', 'first_name'),
+    ('Отчество', 'middle_name'),
+    ('Email', 'email'),
+    ('Начало периода обучения', 'start_date'),
+    ('Окончание периода обучения', 'end_date'),
+    ('Программа обучения', 'program_name'),
+    ('Регион', 'region'),
+    ('Категория гражданина', 'category'),
+    ('СНИЛС', 'snils'),
+    ('Дата подачи заявки на РР', 'request_date'),
+    ('ID программы в заявке', 'program_id'),
+    ('Текущий Статус Атлас', 'current_atlas_status'),
+    ('Текущий Статус РР', 'current_rr_status'),
+    ('Предыдущий Статус Атлас', 'prev_atlas_status'),
+    ('Предыдущий Статус РР', 'prev_rr_status'),
+    ('Статус заявки в Атлас', 'atlas_status'),
+    ('Статус заявки в РР', 'rr_status'),
+    ('Программа в LMS', 'LMS'),
+    ('Контактная информация', 'contact'),
+    ('Пол', 'sex'),
+    ('Дата рождения', 'birthday'),
+    ('Гражданство', 'contry'),
+    ('Паспорт', 'passport'),
+    ('Дата выдачи', 'passport_issued_at'),
+    ('Кем выдан паспорт', 'passport_issued_by'),
+    ('Место регистрации', 'reg_address'),
+    ('Номер заявления на РР', 'rr_application'),
+    ('Трудоустройство', 'employment'),
+]
+
+# Даты, которые выгружаются строкой dd.mm.yyyy (чтобы в Excel не было
+# ISO‑формата/серийных чисел).
+EXPORT_DATE_FIELDS = {'start_date', 'end_date', 'request_date'}
+
+# Сколько строк за раз читается из БД при выгрузке
+EXPORT_CHUNK_SIZE = 2000
+# Размер блока при отдаче готового файла клиенту
+EXPORT_STREAM_BLOCK_SIZE = 64 * 1024
+
+
+# Предыдущие статусы на момент среза не хранятся в Application,
+# их подставляет previous_statuses_as_of.
+HIST_PREV_FIELDS = ('hist_prev_atlas_status', 'hist_prev_rr_status')
+
+
+def parse_export_columns(values):
+    """
+    Набор колонок выгрузки из параметра `columns`: имена полей через запятую
+    (или несколько параметров). Порядок сохраняется, повторы отбрасываются.
+    Пусто — None (все колонки). Неизвестное поле — ValueError.
+    """
+    known = dict((field, (header, field)) for header, field in EXPORT_COLUMNS)
+    names = []
+    for value in values or []:
+        for name in str(value).split(','):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Неизвестные колонки выгрузки: {', '.join(unknown)}")
+    return [known[name] for name in names] or None
+
+
+def _export_fields(selected_date=None, columns=None):
+    """
+    Поля queryset для каждой колонки выгрузки.
+    """
+    columns = columns or EXPORT_COLUMNS
+    if not selected_date:
+        return [field for _, field in columns]
+
+    # Queryset уже аннотирован статусами на момент среза (filter_applications).
+    historical = {
+        'current_atlas_status': 'hist_atlas_status',
+        'current_rr_status': 'hist_rr_status',
+        'prev_atlas_status': 'hist_prev_atlas_status',
+        'prev_rr_status': 'hist_prev_rr_status',
+    }
+    return [historical.get(field, field) for _, field in columns]
+
+
+def previous_statuses_as_of(snapshot_dt, queryset):
+    """
+    Предыдущие статусы Атлас и РР на момент snapshot_dt для всех заявок queryset.
+
+    Правило то же, что при импорте: предыдущий статус — последний статус
+    из истории (до среза), отличный от статуса на момент среза. Считается
+    одним проходом оконной функции по StatusHistory, без запросов на строку.
+    Возвращает {application_id: (prev_atlas, prev_rr)} только для заявок,
+    у которых есть хотя бы один предыдущий статус.
+    """
+    ids_sql, ids_params = queryset.values('pk').query.sql_with_params()
+    table = StatusHistory._meta.db_table
+    sql = f"""
+        SELECT application_id,
+               (array_agg(atlas_status ORDER BY snapshot_dt DESC)
+                    FILTER (WHERE atlas_status IS NOT NULL
+                            AND atlas_status IS DISTINCT FROM cur_atlas))[1],
+               (array_agg(rr_status ORDER BY snapshot_dt DESC)
+                    FILTER (WHERE rr_status IS NOT NULL
+                            AND rr_status IS DISTINCT FROM cur_rr))[1]
+        FROM (
+            SELECT application_id, snapshot_dt, atlas_status, rr_status,
+                   FIRST_VALUE(atlas_status) OVER w AS cur_atlas,
+                   FIRST_VALUE(rr_status) OVER w AS cur_rr
+            FROM {table}
+            WHERE snapshot_dt <= %s AND application_id IN ({ids_sql})
+            WINDOW w AS (PARTITION BY application_id ORDER BY snapshot_dt DESC)
+        ) h
+        GROUP BY application_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [snapshot_dt, *ids_params])
+        return {
+            app_id: (prev_atlas, prev_rr)
+            for app_id, prev_atlas, prev_rr in cursor.fetchall()
+            if prev_atlas is not None or prev_rr is not None
+        }
+
+
+def _export_headers(columns=None):
+    return [header for header, _ in columns or EXPORT_COLUMNS]
+
+
+def iter_export_rows(queryset, selected_date=None, formatted=True, columns=None):
+    """
+    Строки выгрузки (списки значений в порядке колонок; по умолчанию EXPORT_COLUMNS).
+
+    Читает только нужные колонки через values_list и server-side курсор
+    порциями по EXPORT_CHUNK_SIZE, поэтому память не зависит от размера выборки.
+    formatted=False оставляет даты и признак трудоустройства «как есть»
+    (для типизированных форматов вроде Parquet).
+    """
+    fields = _export_fields(selected_date, columns)
+    needs_previous = any(f in HIST_PREV_FIELDS for f in fields)
+    db_fields = [f for f in fields if f not in HIST_PREV_FIELDS]
+    if needs_previous:
+        db_fields.append('pk')
+    previous = previous_statuses_as_of(selected_date, queryset) if needs_previous else {}
+
+    for values in queryset.values_list(*db_fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = dict(zip(db_fields, values))
+        if needs_previous:
+            prev_atlas, prev_rr = previous.get(record['pk'], (None, None))
+            record['hist_prev_atlas_status'] = prev_atlas
+            record['hist_prev_rr_status'] = prev_rr
+        row = []
+        for field in fields:
+            value = record[field]
+            if formatted and field in EXPORT_DATE_FIELDS:
+                value = value.strftime('%d.%m.%Y') if value else ''
+            elif formatted and field == 'employment':
+                value = "Подтверждено" if value else "Не подтверждено"
+            row.append(value)
+        yield row
+
+
+def _iter_chunks(rows, size=EXPORT_CHUNK_SIZE):
+    """
+    Группирует поток строк в списки по size штук.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_file(file, block_size=EXPORT_STREAM_BLOCK_SIZE):
+    """
+    Отдаёт содержимое файла блоками и закрывает его по окончании.
+    """
+    try:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        file.close()
+
+
+def _export_filename(extension: str) -> str:
+    return f'atlas_export_{datetime.now().strftime("%Y%m%d_%H%M")}.{extension}'
+
+
+def write_excel(queryset, file, selected_date=None, columns=None):
+    """
+    Пишет выгрузку в файл через write-only книгу openpyxl:
+    строки сразу сбрасываются на диск и не копятся в памяти.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(_export_headers(columns))
+    for row in iter_export_rows(queryset, selected_date, columns=columns):
+        ws.append(row)
+    wb.save(file)
+
+
+def export_to_excel(queryset, selected_date=None, columns=None):
+    """
+    Выгрузка в Excel.
+    Книга собирается во временном файле, а клиенту отдаётся блоками
+    через StreamingHttpResponse — память воркера не растёт с размером выгрузки.
+    Отдача начинается только после записи всей книги (xlsx — zip‑архив,
+    который openpyxl дописывает при сохранении), поэтому время до первого
+    байта растёт с объёмом; потоково с первой строки отдаётся только CSV.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_excel(queryset, tmp, selected_date, columns)
+    tmp.seek(0)
+
+    response = StreamingHttpResponse(
+        _iter_file(tmp),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = f'attachment; filename={_export_filename("xlsx")}'
+    return response
+
+
+class _Echo:
+    """
+    Псевдо‑буфер для csv.writer: writerow возвращает строку, а не пишет её.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_blocks(queryset, selected_date=None, columns=None):
+    """
+    CSV (UTF-8, разделитель «,») блоками по EXPORT_CHUNK_SIZE строк.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(_export_headers(columns)).encode('utf-8')
+    for chunk in _iter_chunks(iter_export_rows(queryset, selected_date, columns=columns)):
+        yield ''.join(writer.writerow(row) for row in chunk).encode('utf-8')
+
+
+def write_csv(queryset, file, selected_date=None, columns=None):
+    for block in iter_csv_blocks(queryset, selected_date, columns):
+        file.write(block)
+
+
+def export_to_csv(queryset, selected_date=None, columns=None):
+    """
+    Потоковая выгрузка в CSV: строки формируются по мере чтения из БД,
+    без временного файла.
+    """
+    response = StreamingHttpResponse(
+        iter_csv_blocks(queryset, selected_date, columns),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename={_export_filename("csv")}'
+    return response
+
+
+def _parquet_schema(columns=None):
+    import pyarrow as pa
+
+    def column_type(field):
+        if field in EXPORT_DATE_FIELDS or field in ('birthday', 'passport_issued_at'):
+            return pa.date32()
+        if field == 'employment':
+            return pa.bool_()
+        return pa.string()
+
+    return pa.schema([(header, column_type(field)) for header, field in columns or EXPORT_COLUMNS])
+
+
+def write_parquet(queryset, file, selected_date=None, columns=None):
+    """
+    Parquet с типизированными колонками; каждая порция строк — отдельная row group.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(columns)
+
+    def to_array(field, values):
+        # Текстовые колонки могут содержать числа из Excel (СНИЛС, ID) — приводим к str
+        if pa.types.is_string(field.type):
+            values = [None if v is None else str(v) for v in values]
+        return pa.array(values, type=field.type)
+
+    with pq.ParquetWriter(file, schema, compression='snappy') as writer:
+        rows = iter_export_rows(queryset, selected_date, formatted=False, columns=columns)
+        for chunk in _iter_chunks(rows):
+            arrays = [to_array(field, values) for field, values in zip(schema, zip(*chunk))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def export_to_parquet(queryset, selected_date=None, columns=None):
+    """
+    Выгрузка в Parquet. Файл пишется порциями во временный файл
+    и отдаётся клиенту блоками через StreamingHttpResponse.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_parquet(queryset, tmp, selected_date, columns)
+    tmp.seek(0)
+
+    response = StreamingHttpResponse(_iter_file(tmp), content_type='application/vnd.apache.parquet')
+    response['Content-Disposition'] = f'attachment; filename={_export_filename("parquet")}'
+    return response
+
+
+# Форматы выгрузки: формат -> (ответ для скачивания, запись в файл, расширение)
+EXPORT_FORMATS = {
+    'xlsx': (export_to_excel, write_excel, 'xlsx'),
+    'csv': (export_to_csv, write_csv, 'csv'),
+    'parquet': (export_to_parquet, write_parquet, 'parquet'),
+}
+
+
+def resolve_export_format(value):
+    """
+    Формат из параметра `export`. Старые значения (`true`, `1`) означают Excel.
+    """
+    return value if value in EXPORT_FORMATS else 'xlsx'
+
+
+def export_response(queryset, selected_date=None, export_format='xlsx', columns=None):
+    response_func, _, _ = EXPORT_FORMATS[export_format]
+    return response_func(queryset, selected_date, columns)
+
+
+def iter_ndjson(rows, transform=None):
+    """
+    NDJSON (одна JSON‑запись на строку, UTF-8) блоками по EXPORT_CHUNK_SIZE строк.
+    transform — опциональное преобразование каждой пачки строк перед записью
+    (например, добавить статусы на срез одним запросом на пачку).
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in _iter_chunks(rows):
+        if transform is not None:
+            chunk = transform(chunk)
+        yield ''.join(f"{encoder.encode(item)}\n" for item in chunk).encode('utf-8')
+
+
+def iter_gzip(blocks):
+    """
+    Сжимает поток байтовых блоков в gzip на лету.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def ndjson_response(rows, name, transform=None, compress=False):
+    """
+    Потоковый дамп в NDJSON: строки читаются из БД серверным курсором
+    (rows — результат .iterator()), память сервера не растёт с объёмом выгрузки.
+    compress=True — тело сжимается gzip (Content-Encoding: gzip).
+    """
+    blocks = iter_ndjson(rows, transform)
+    response = StreamingHttpResponse(
+        iter_gzip(blocks) if compress else blocks,
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = f'attachment; filename=atlas_{name}_{datetime.now().strftime("%Y%m%d_%H%M")}.ndjson'
     return response
+
+
+def export_params(params):
+    """
+    Только непустые параметры фильтров — то, что сохраняется в ExportJob.params.
+    """
+    return {name: params.get(name) for name in FILTER_PARAMS if params.get(name)}
+
+
+def request_export_job(user, params, export_format='xlsx', columns=None):
+    """
+    Ставит фоновую выгрузку в очередь Celery или переиспользует готовую.
+
+    Ключ выгрузки — фильтры + формат + версия данных: пока не было нового
+    импорта, повторный такой же запрос получает уже сформированный файл.
+    Возвращает ExportJob (статус DONE, если файл уже готов).
+    """
+    from .tasks import build_export_file
+
+    filters = export_params(params)
+    version = get_data_version()
+    data_version = version[0]
+    column_names = [field for _, field in columns or []]
+    cache_key = make_cache_key('export', filters, export_format, column_names, version)
+
+    ready = (
+        ExportJob.objects
+        .filter(cache_key=cache_key, status=ExportJob.STATUS_DONE)
+        .exclude(file='')
+        .first()
+    )
+    if ready is not None:
+        if ready.user_id == user.pk:
+            return ready
+        # Тот же файл, но запись своя — чтобы выгрузка была в списке пользователя
+        return ExportJob.objects.create(
+            user=user,
+            params=filters,
+            export_format=export_format,
+            columns=column_names,
+            data_version=data_version,
+            cache_key=cache_key,
+            status=ExportJob.STATUS_DONE,
+            file=ready.file.name,
+            notified=True,
+            finished_at=timezone.now(),
+        )
+
+    in_progress = ExportJob.objects.filter(
+        cache_key=cache_key,
+        user=user,
+        status__in=[ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING],
+    ).first()
+    if in_progress is not None:
+        return in_progress
+
+    job = ExportJob.objects.create(
+        user=user,
+        params=filters,
+        export_format=export_format,
+        columns=column_names,
+        data_version=data_version,
+        cache_key=cache_key,
+    )
+    transaction.on_commit(lambda: build_export_file.delay(job.pk))
+    return job
+
+
+def build_export_job(job):
+    """
+    Формирует файл фоновой выгрузки и сохраняет его в default storage.
+    Ошибки не пробрасываются, а записываются в job.error.
+    """
+    job.status = ExportJob.STATUS_RUNNING
+    job.save(update_fields=['status'])
+
+    try:
+        _, writer, extension = EXPORT_FORMATS[job.export_format]
+        queryset, selected_dt = filter_applications(job.params)
+        columns = parse_export_columns(job.columns)
+        with tempfile.TemporaryFile() as tmp:
+            writer(queryset, tmp, selected_dt, columns)
+            tmp.seek(0)
+            job.file.save(_export_filename(extension), File(tmp), save=False)
+        job.status = ExportJob.STATUS_DONE
+    except Exception as exc:  # noqa: BLE001
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(exc)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'error', 'finished_at'])
+    return job
+
+
+def cleanup_export_jobs(ttl_days=None):
+    """
+    Удаляет фоновые выгрузки старше ttl_days (по умолчанию HISTORY_EXPORT_TTL_DAYS)
+    вместе с файлами. Один файл может быть у нескольких ExportJob (повторный
+    запрос того же ключа), поэтому файл удаляется, только когда на него
+    больше не ссылается ни одна оставшаяся запись.
+    Возвращает (удалено записей, удалено файлов).
+    """
+    if ttl_days is None:
+        ttl_days = getattr(settings, 'HISTORY_EXPORT_TTL_DAYS', 7)
+    expired = ExportJob.objects.filter(created_at__lt=timezone.now() - timedelta(days=ttl_days))
+    file_names = set(expired.exclude(file='').values_list('file', flat=True))
+    deleted_jobs, _ = expired.delete()
+
+    # Ссылки проверяем уже после удаления записей: свежая запись, переиспользовавшая
+    # файл, сохраняет его
+    still_used = set(
+        ExportJob.objects.filter(file__in=file_names).values_list('file', flat=True)
+    )
+    deleted_files = 0
+    for name in file_names - still_used:
+        if default_storage.exists(name):
+            default_storage.delete(name)
+            deleted_files += 1
+    return deleted_jobs, deleted_files
+
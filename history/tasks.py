@@ -69,4 +69,29 @@ def run_export_schedule(schedule_id: int):
     run_export_schedule.apply_async(args=(schedule_id,), countdown=countdown)
 
 
+@shared_task
+def build_export_file(job_id: int):
+    """
+    Celery‑задача фоновой выгрузки: формирует файл для ExportJob.
+    Пользователь получит ссылку на скачивание при следующем открытии списка.
+    """
+    from history.models import ExportJob
+    from history.services import build_export_job
+
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+    except ExportJob.DoesNotExist:
+        return
+
+    build_export_job(job)
+
+
+@shared_task
+def cleanup_export_jobs():
+    """
+    Celery‑задача (beat, раз в сутки): удаляет фоновые выгрузки старше
+    HISTORY_EXPORT_TTL_DAYS и файлы, на которые больше никто не ссылается.
+    """
+    from history.services import cleanup_export_jobs as cleanup
 
+    return cleanup()
@@ -11,5 +11,10 @@ urlpatterns = [
     path('', views.application_list, name='application_list'),
     path('logout/', views.logout_view, name='logout'),
     path('api-guide/', views.api_guide, name="api-guide"),
+    path('diff/', views.snapshot_diff, name='snapshot_diff'),
+    path('exports/', views.export_list, name='export_list'),
+    path('exports/<int:pk>/download/', views.export_download, name='export_download'),
+    path('api/snapshot-diff/', views.SnapshotDiffView.as_view(), name='api-snapshot-diff'),
+    path('api/aggregates/', views.ApplicationAggregatesView.as_view(), name='api-aggregates'),
     path('api/', include(router.urls)),
 ]
@@ -1,16 +1,49 @@
-from django.shortcuts import render, redirect
+import os
+from urllib.parse import urlencode
+
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Subquery, OuterRef, Count
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Count
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.http import FileResponse, HttpRequest, QueryDict
+from django.urls import resolve, reverse
+from django.utils.html import format_html
+from django.utils.http import http_date
+from .caching import get_data_version, make_cache_key, make_etag, user_permission_set
 from .forms import ImportForm
-from .services import import_data, export_to_excel
-from .models import Application, StatusHistory, ImportHistory
-from datetime import datetime
-import pandas as pd
+from .services import (
+    AGGREGATE_FIELDS,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_COLUMNS,
+    EXPORT_FORMATS,
+    FILTER_PARAMS,
+    aggregate_applications,
+    annotate_statuses_as_of,
+    diff_snapshots,
+    export_params,
+    export_response,
+    filter_applications,
+    import_data,
+    ndjson_response,
+    parse_export_columns,
+    parse_snapshot_param,
+    request_export_job,
+    resolve_export_format,
+    snapshot_prefix_range,
+    statuses_as_of,
+)
+from .models import Application, StatusHistory, ImportHistory, ExportJob
 from itertools import zip_longest
 
 
+LIST_PAGE_SIZE = 50
+
+LIST_FILTER_PARAMS = FILTER_PARAMS + ('page',)
+
+
 def application_list(request):
 
     if not request.user.is_authenticated:
@@ -34,19 +67,6 @@ def application_list(request):
     if request.method == 'GET' and 'reset' in request.GET:
         return redirect('application_list')
 
-    # Fetch import history
-    import_history = ImportHistory.objects.all()
-    last_import = import_history.first()
-    # Unique snapshot points (datetime) for filter dropdown (latest first)
-    snapshot_points = (
-        ImportHistory.objects
-        .order_by('-snapshot_dt')
-        .values_list('snapshot_dt', flat=True)
-        .distinct()
-    )
-
-    queryset = Application.objects.all()
-    
     # Filters
     search_query = request.GET.get('search', '')
     program_filter = request.GET.get('program', '')
@@ -62,78 +82,173 @@ def application_list(request):
     
     filter_date = request.GET.get('date', '') # Snapshot date
 
-    if search_query:
-        queryset = queryset.filter(
-            Q(last_name__icontains=search_query) | 
-            Q(first_name__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(rr_id__icontains=search_query)
+    queryset, selected_dt = filter_applications(request.GET)
+
+    if request.GET.get('export'):
+        export_format = resolve_export_format(request.GET.get('export'))
+        try:
+            columns = parse_export_columns(request.GET.getlist('columns'))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return _redirect_to_list(request)
+        if request.GET.get('background'):
+            return _queue_export(request, export_format, columns)
+        return export_response(queryset, selected_dt, export_format, columns)
+
+    _notify_finished_exports(request)
+
+    data_version = get_data_version()
+    permissions = user_permission_set(request.user)
+    list_params = _normalized_list_params(request)
+
+    # Conditional GET: пока версия данных не изменилась (импорт, правки), повторные
+    # обновления страницы получают 304 без единого запроса к заявкам.
+    # Страницы с непоказанными сообщениями (например, после импорта) всегда
+    # отрисовываем заново, иначе браузер покажет старую копию без сообщения.
+    etag = last_modified = None
+    if request.method == 'GET' and not len(messages.get_messages(request)):
+        etag = make_etag(
+            data_version,
+            list_params,
+            permissions,
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+        if data_version[1] is not None:
+            last_modified = int(data_version[1].timestamp())
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+    cache_key = make_cache_key('list', data_version, list_params, permissions)
+    list_data = cache.get(cache_key)
+    if list_data is None:
+        list_data = _build_list_data(queryset, request.GET.get('page'))
+        cache.set(cache_key, list_data, getattr(settings, 'HISTORY_LIST_CACHE_TIMEOUT', 3600))
+
+    # Страница собирается из закэшированных строк; Paginator по range даёт
+    # шаблону num_pages/has_next без обращения к БД.
+    paginator = Paginator(range(list_data['count']), LIST_PAGE_SIZE)
+    page_obj = Page(list_data['rows'], list_data['number'], paginator)
+
+    stats_atlas = list_data['stats_atlas']
+    stats_rr = list_data['stats_rr']
+    stats_prev_atlas = list_data['stats_prev_atlas']
+    stats_prev_rr = list_data['stats_prev_rr']
+    stats_rows = zip_longest(stats_atlas, stats_prev_atlas, stats_rr, stats_prev_rr, fillvalue=None)
+
+    context = {
+        'page_obj': page_obj,
+        'programs': list_data['programs'],
+        'statuses_atlas': list_data['statuses_atlas'],
+        'statuses_rr': list_data['statuses_rr'],
+        'prev_statuses_atlas': list_data['prev_statuses_atlas'],
+        'prev_statuses_rr': list_data['prev_statuses_rr'],
+        'selected_date': filter_date,
+        'search_query': search_query,
+        'program_filter': program_filter,
+        'status_atlas_filter': status_atlas_filter,
+        'status_rr_filter': status_rr_filter,
+        'prev_status_atlas_filter': prev_status_atlas_filter,
+        'prev_status_rr_filter': prev_status_rr_filter,
+        'start_date_filter': start_date_filter,
+        'end_date_filter': end_date_filter,
+        'import_form': import_form,
+        'export_columns': EXPORT_COLUMNS,
+        'selected_columns': request.GET.getlist('columns'),
+        'stats_atlas': stats_atlas,
+        'stats_rr': stats_rr,
+        'stats_prev_atlas': stats_prev_atlas,
+        'stats_prev_rr': stats_prev_rr,
+        'stats_rows': stats_rows,
+        'snapshot_points': list_data['snapshot_points'],
+        'import_history': list_data['import_history'],
+        'last_import': list_data['last_import'],
+    }
+    response = render(request, 'history/list.html', context)
+    if etag is not None:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _queue_export(request, export_format, columns):
+    """
+    Ставит выгрузку текущего фильтра в фон и возвращает пользователя к списку.
+    """
+    job = request_export_job(request.user, request.GET, export_format, columns)
+    if job.status == ExportJob.STATUS_DONE:
+        job.notified = True
+        job.save(update_fields=['notified'])
+        messages.success(request, _export_ready_message(job))
+    else:
+        messages.info(
+            request,
+            "Выгрузка поставлена в очередь. Ссылка на файл появится здесь, когда он будет готов.",
         )
+    return _redirect_to_list(request)
 
-    if program_filter:
-        queryset = queryset.filter(program_name__icontains=program_filter)
 
-    if start_date_filter:
-        queryset = queryset.filter(start_date=start_date_filter)
+def _redirect_to_list(request):
+    """
+    Редирект на список с текущими фильтрами (без параметров выгрузки).
+    """
+    query = urlencode(export_params(request.GET))
+    return redirect(f"{reverse('application_list')}?{query}" if query else reverse('application_list'))
 
-    if end_date_filter:
-        queryset = queryset.filter(end_date=end_date_filter)
-        
-    # Handling Current vs Historical Status Filters
-    selected_dt = None
-    if filter_date:
-        # сначала пробуем ISO-даты+время из выпадающего списка,
-        # если не получилось — пробуем старый формат только с датой
-        try:
-            selected_dt = datetime.fromisoformat(filter_date)
-        except ValueError:
-            try:
-                selected_dt = datetime.strptime(filter_date, '%Y-%m-%d')
-            except ValueError:
-                selected_dt = None
-
-    if selected_dt:
-        # Subquery: состояние заявки на момент выбранной даты/времени
-        latest_history = StatusHistory.objects.filter(
-            application=OuterRef('pk'),
-            snapshot_dt__lte=selected_dt
-        ).order_by('-snapshot_dt')
-
-        queryset = queryset.annotate(
-            hist_atlas_status=Subquery(latest_history.values('atlas_status')[:1]),
-            hist_rr_status=Subquery(latest_history.values('rr_status')[:1])
-        ).filter(hist_atlas_status__isnull=False)  # Только заявки, уже существовавшие к этому моменту
-
-        if status_atlas_filter:
-            queryset = queryset.filter(hist_atlas_status=status_atlas_filter)
-
-        if status_rr_filter:
-            queryset = queryset.filter(hist_rr_status=status_rr_filter)
-    else:
-        # Standard filtering
-        if status_atlas_filter:
-            queryset = queryset.filter(current_atlas_status=status_atlas_filter)
-        
-        if status_rr_filter:
-            queryset = queryset.filter(current_rr_status=status_rr_filter)
-            
-        if prev_status_atlas_filter:
-            queryset = queryset.filter(prev_atlas_status=prev_status_atlas_filter)
-            
-        if prev_status_rr_filter:
-            queryset = queryset.filter(prev_rr_status=prev_status_rr_filter)
 
-    if request.GET.get('export'):
-        return export_to_excel(queryset, selected_dt)
+def _export_ready_message(job):
+    return format_html(
+        'Выгрузка готова: <a href="{}">скачать файл</a>.',
+        reverse('export_download', args=[job.pk]),
+    )
+
+
+def _notify_finished_exports(request):
+    """
+    Сообщения о завершённых фоновых выгрузках пользователя (один раз на выгрузку).
+    """
+    finished = list(
+        request.user.export_jobs
+        .filter(notified=False, status__in=[ExportJob.STATUS_DONE, ExportJob.STATUS_FAILED])
+    )
+    for job in finished:
+        if job.status == ExportJob.STATUS_DONE:
+            messages.success(request, _export_ready_message(job))
+        else:
+            messages.error(request, f"Ошибка фоновой выгрузки: {job.error}")
+    if finished:
+        ExportJob.objects.filter(pk__in=[job.pk for job in finished]).update(notified=True)
+
+
+def _normalized_list_params(request):
+    """
+    Параметры фильтров списка в каноническом виде (без пустых значений,
+    отсортированные) — для ключа кэша и ETag.
+    """
+    return sorted(
+        (name, request.GET.get(name))
+        for name in LIST_FILTER_PARAMS
+        if request.GET.get(name)
+    )
 
+
+def _build_list_data(queryset, page_number):
+    """
+    Выполняет все запросы страницы списка и возвращает результат в виде,
+    пригодном для кэширования (только списки и модели, без ленивых queryset).
+    """
     # Statistics (based on filtered queryset)
     stats_atlas = queryset.values('current_atlas_status').annotate(total=Count('id')).order_by('-total')
     stats_rr = queryset.values('current_rr_status').annotate(total=Count('id')).order_by('-total')
     stats_prev_atlas = queryset.values('prev_atlas_status').annotate(total=Count('id')).order_by('-total')
     stats_prev_rr = queryset.values('prev_rr_status').annotate(total=Count('id')).order_by('-total')
 
-    stats_rows = zip_longest(stats_atlas, stats_prev_atlas, stats_rr, stats_prev_rr, fillvalue=None)
-
     # Get unique values for filter dropdowns
     programs = Application.objects.values_list('program_name', flat=True).distinct().order_by('program_name')
     
@@ -143,41 +258,113 @@ def application_list(request):
     prev_statuses_atlas = Application.objects.values_list('prev_atlas_status', flat=True).distinct().order_by('prev_atlas_status')
     prev_statuses_rr = Application.objects.values_list('prev_rr_status', flat=True).distinct().order_by('prev_rr_status')
 
+    # Fetch import history
+    import_history = list(ImportHistory.objects.all())
+    # Unique snapshot points (datetime) for filter dropdown (latest first)
+    snapshot_points = (
+        ImportHistory.objects
+        .order_by('-snapshot_dt')
+        .values_list('snapshot_dt', flat=True)
+        .distinct()
+    )
+
     # Prefetch history
     queryset = queryset.prefetch_related('history')
     
     # Pagination
-    paginator = Paginator(queryset, 50)
-    page_number = request.GET.get('page')
+    paginator = Paginator(queryset, LIST_PAGE_SIZE)
     page_obj = paginator.get_page(page_number)
 
+    return {
+        'rows': list(page_obj.object_list),
+        'count': paginator.count,
+        'number': page_obj.number,
+        'stats_atlas': list(stats_atlas),
+        'stats_rr': list(stats_rr),
+        'stats_prev_atlas': list(stats_prev_atlas),
+        'stats_prev_rr': list(stats_prev_rr),
+        'programs': list(programs),
+        'statuses_atlas': list(statuses_atlas),
+        'statuses_rr': list(statuses_rr),
+        'prev_statuses_atlas': list(prev_statuses_atlas),
+        'prev_statuses_rr': list(prev_statuses_rr),
+        'import_history': import_history,
+        'last_import': import_history[0] if import_history else None,
+        'snapshot_points': list(snapshot_points),
+    }
+
+
+def _resolve_import(value):
+    """
+    ImportHistory по id из параметра запроса (None, если id некорректен).
+    """
+    try:
+        return ImportHistory.objects.filter(pk=int(value)).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def snapshot_diff(request):
+    """
+    Сравнение двух срезов: какие заявки сменили статус между импортами.
+    """
+    if not request.user.is_authenticated:
+        messages.warning(request, "Для доступа к странице требуется авторизоваться.")
+        return redirect(f'{settings.LOGIN_URL}?next={request.path}')
+
+    imports = ImportHistory.objects.order_by('-snapshot_dt')
+    from_param = request.GET.get('from', '')
+    to_param = request.GET.get('to', '')
+
+    diff = None
+    page_obj = None
+    if from_param and to_param:
+        from_import = _resolve_import(from_param)
+        to_import = _resolve_import(to_param)
+        if from_import is None or to_import is None:
+            messages.error(request, "Выбранный срез не найден.")
+        else:
+            diff = diff_snapshots(from_import, to_import)
+            paginator = Paginator(diff['changes'], LIST_PAGE_SIZE)
+            page_obj = paginator.get_page(request.GET.get('page'))
+
     context = {
+        'imports': imports,
+        'from_param': from_param,
+        'to_param': to_param,
+        'diff': diff,
         'page_obj': page_obj,
-        'programs': programs,
-        'statuses_atlas': statuses_atlas,
-        'statuses_rr': statuses_rr,
-        'prev_statuses_atlas': prev_statuses_atlas,
-        'prev_statuses_rr': prev_statuses_rr,
-        'selected_date': filter_date,
-        'search_query': search_query,
-        'program_filter': program_filter,
-        'status_atlas_filter': status_atlas_filter,
-        'status_rr_filter': status_rr_filter,
-        'prev_status_atlas_filter': prev_status_atlas_filter,
-        'prev_status_rr_filter': prev_status_rr_filter,
-        'start_date_filter': start_date_filter,
-        'end_date_filter': end_date_filter,
-        'import_form': import_form,
-        'stats_atlas': stats_atlas,
-        'stats_rr': stats_rr,
-        'stats_prev_atlas': stats_prev_atlas,
-        'stats_prev_rr': stats_prev_rr,
-        'stats_rows': stats_rows,
-        'snapshot_points': snapshot_points,
-        'import_history': import_history,
-        'last_import': last_import,
     }
-    return render(request, 'history/list.html', context)
+    return render(request, 'history/diff.html', context)
+
+
+def export_list(request):
+    """
+    Фоновые выгрузки текущего пользователя.
+    """
+    if not request.user.is_authenticated:
+        messages.warning(request, "Для доступа к странице требуется авторизоваться.")
+        return redirect(f'{settings.LOGIN_URL}?next={request.path}')
+
+    jobs = request.user.export_jobs.all()[:50]
+    return render(request, 'history/exports.html', {'jobs': jobs})
+
+
+def export_download(request, pk):
+    """
+    Скачивание готового файла фоновой выгрузки (только своей).
+    """
+    if not request.user.is_authenticated:
+        messages.warning(request, "Для доступа к странице требуется авторизоваться.")
+        return redirect(f'{settings.LOGIN_URL}?next={request.path}')
+
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, status=ExportJob.STATUS_DONE)
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=os.path.basename(job.file.name),
+    )
+
 
 def logout_view(request):
     from django.contrib.auth import logout
@@ -187,16 +374,21 @@ def logout_view(request):
 import django_filters
 from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.pagination import PageNumberPagination
+from .authentication import CachedTokenAuthentication
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.constants import EMPTY_VALUES
 
 
 def api_guide(request):
     from django.contrib.auth.models import User
     from rest_framework.authtoken.models import Token
-    import requests
     import urllib.parse
 
     if not request.user.is_authenticated:
@@ -212,39 +404,134 @@ def api_guide(request):
     group = 'application'
     if 'history' in request.GET:
         group = 'history-status'
-    url = f'http://{request.get_host()}/api/{group}' 
-    headers = { 'Authorization': f'Token {tkn}' }
 
     params = {}
-    for arg in request.POST.dict():
-        value = request.POST.dict().get(arg)
-        if arg != 'csrfmiddlewaretoken' and arg != 'apiLink' and value != '':
-            params.setdefault(arg, value)
-    
     if request.method == 'POST':
-        response = requests.get(url,headers=headers, params=params)
-    else:
-        response = requests.get(url,headers=headers)
+        for arg in request.POST.dict():
+            value = request.POST.dict().get(arg)
+            if arg != 'csrfmiddlewaretoken' and arg != 'apiLink' and value != '':
+                params.setdefault(arg, value)
+
+    response = _call_api_in_process(request, f'{group}-list', params, f'Token {tkn}')
     import json
     try:
-        JsonReponse = json.dumps(response.json())
-    except:
+        JsonReponse = json.dumps(json.loads(response.content))
+    except ValueError:
         JsonReponse = {"result": "Не предоставлен токен!"}
+    query = urlencode(params)
+    url = request.build_absolute_uri(reverse(f'{group}-list')) + (f'?{query}' if query else '')
     context={
         'login': login,
         'token': tkn,
         'JsonReponse': JsonReponse,
-        'URL': str(urllib.parse.unquote(response.url))
+        'URL': str(urllib.parse.unquote(url))
     }
     if 'history' in request.GET:
         return render(request, "history/history_api_form.html", context=context)
     return render(request, "history/app_api_form.html", context=context)
 
+
+def _call_api_in_process(request, url_name, params, authorization):
+    """
+    Выполняет GET к API внутри текущего процесса (без HTTP‑запроса к своему же
+    серверу): строит запрос к view по имени маршрута и возвращает отрисованный ответ.
+    Авторизация — как у внешнего клиента, через заголовок Authorization.
+    """
+    path = reverse(url_name)
+    query = urlencode(params)
+    api_request = HttpRequest()
+    api_request.method = 'GET'
+    api_request.path = api_request.path_info = path
+    api_request.GET = QueryDict(query)
+    api_request.META = {
+        key: value
+        for key, value in request.META.items()
+        if key in ('SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST', 'REMOTE_ADDR', 'wsgi.url_scheme')
+    }
+    api_request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_ACCEPT': 'application/json',
+        'HTTP_AUTHORIZATION': authorization,
+    })
+    response = resolve(path).func(api_request)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+# Сколько rr_id можно запросить в одном POST /api/history-status/bulk/
+BULK_HISTORY_MAX_IDS = 1000
+
+
+def _snapshot_query_param(request, name):
+    """
+    Дата/время среза из query‑параметра API; некорректное значение — 400.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    snapshot_dt = parse_snapshot_param(value)
+    if snapshot_dt is None:
+        raise ValidationError({name: "Ожидается дата YYYY-MM-DD или дата и время в ISO‑формате."})
+    return snapshot_dt
+
+class NDJSONRenderer(BaseRenderer):
+    # Чтобы Accept: application/x-ndjson не давал 406 на дампах (ошибки — тоже NDJSON)
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data) + b'\n'
+
+class DataVersionETagMixin:
+    """
+    Conditional GET для list: ETag строится из версии данных (последний импорт
+    и метка изменения), параметров запроса и формата ответа. Пока версия
+    не изменилась, при совпадении If-None-Match сразу отдаётся 304 — queryset не выполняется.
+    """
+
+    def list(self, request, *args, **kwargs):
+        data_version = get_data_version()
+        etag = make_etag(
+            'api',
+            self.basename,
+            data_version,
+            sorted(request.query_params.lists()),
+            request.accepted_renderer.format,
+        )
+        last_modified = int(data_version[1].timestamp()) if data_version[1] is not None else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = self.get_list_response(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 class Pagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = "page_size"
 
+class AsOfPagination(CursorPagination):
+    # Курсор по pk: стабильные страницы без COUNT(*) и OFFSET на больших выборках
+    page_size = 50
+    page_size_query_param = "page_size"
+    ordering = "pk"
+
 class ApplicationSerializer(serializers.ModelSerializer):
+    # Ревизия данных, при которой заявка менялась последний раз (курсор для ?since_version=)
+    version = serializers.IntegerField(source='change_version', read_only=True)
+
     class Meta:
         model = Application
         fields =[
@@ -275,12 +562,31 @@ class ApplicationSerializer(serializers.ModelSerializer):
             'passport_issued_by',
             'reg_address',
             'rr_application',
-            'employment'
+            'employment',
+            'version'
         ]
 
+class StatusFilter(django_filters.CharFilter):
+    """
+    Фильтр по статусу заявки. Если queryset аннотирован статусами на момент
+    среза (?as_of=, см. annotate_statuses_as_of), фильтрует по ним, а не по текущим.
+    """
+    as_of_fields = {
+        'current_atlas_status': 'hist_atlas_status',
+        'current_rr_status': 'hist_rr_status',
+    }
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        field_name = self.field_name
+        if self.as_of_fields.get(field_name) in qs.query.annotations:
+            field_name = self.as_of_fields[field_name]
+        return qs.filter(**{f'{field_name}__{self.lookup_expr}': value})
+
 class ApplicationFilter(django_filters.FilterSet):
-    current_atlas_status = django_filters.CharFilter(field_name='current_atlas_status', lookup_expr='exact')
-    current_atlas_status__contains = django_filters.CharFilter(field_name='current_atlas_status', lookup_expr='contains')
+    current_atlas_status = StatusFilter(field_name='current_atlas_status', lookup_expr='exact')
+    current_atlas_status__contains = StatusFilter(field_name='current_atlas_status', lookup_expr='contains')
     
     program_name = django_filters.CharFilter(field_name='program_name', lookup_expr='exact')
     program_name__contains = django_filters.CharFilter(field_name='program_name', lookup_expr='contains')
@@ -294,12 +600,26 @@ class ApplicationFilter(django_filters.FilterSet):
     category = django_filters.CharFilter(field_name='category', lookup_expr='exact')
     category__contains = django_filters.CharFilter(field_name='category', lookup_expr='contains')
 
+    # Change feed: заявки, изменившиеся после указанной версии. since_import —
+    # прежнее имя параметра: старые курсоры (id импорта) не больше новых версий
+    since_version = django_filters.NumberFilter(method='filter_since_version')
+    since_import = django_filters.NumberFilter(method='filter_since_version')
+
     class Meta:
         model = Application
         fields = [] 
 
-class ApplicationViewSet(viewsets.ReadOnlyModelViewSet):
-    authentication_classes = [TokenAuthentication]
+    def filter_since_version(self, queryset, name, value):
+        # Стабильный порядок по версии, чтобы клиент мог продолжать с максимальной
+        # полученной version; индекс по change_version покрывает фильтр.
+        return (
+            queryset
+            .filter(change_version__gt=value)
+            .order_by('change_version', 'pk')
+        )
+
+class ApplicationViewSet(DataVersionETagMixin, viewsets.ReadOnlyModelViewSet):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     filterset_class = ApplicationFilter
     queryset = Application.objects.all()
@@ -307,6 +627,109 @@ class ApplicationViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     pagination_class = Pagination
 
+    def get_as_of(self):
+        return _snapshot_query_param(self.request, 'as_of')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        as_of = self.get_as_of()
+        if as_of is not None:
+            # Статусы на срез — и для фильтров current_*_status (см. StatusFilter)
+            queryset = annotate_statuses_as_of(queryset, as_of)
+        return queryset
+
+    def get_list_response(self, request, *args, **kwargs):
+        as_of = self.get_as_of()
+        # ?export=xlsx|csv|parquet — файл с теми же колонками, что и выгрузка со страницы списка
+        export_format = request.query_params.get('export')
+        if export_format:
+            if export_format not in EXPORT_FORMATS:
+                raise ValidationError({'export': f"Допустимые форматы: {', '.join(EXPORT_FORMATS)}."})
+            try:
+                columns = parse_export_columns(request.query_params.getlist('columns'))
+            except ValueError as e:
+                raise ValidationError({'columns': str(e)})
+            queryset = self.filter_queryset(self.get_queryset())
+            return export_response(queryset, as_of, export_format, columns)
+        return self.list_values(request, as_of)
+
+    def get_output_fields(self):
+        """
+        Поля ответа списка: {имя в JSON: поле БД}. ?fields=rr_id,current_atlas_status
+        ограничивает и SELECT, и ответ; по умолчанию — все поля ApplicationSerializer.
+        """
+        available = {
+            name: field.source
+            for name, field in ApplicationSerializer().fields.items()
+        }
+        requested = [
+            name.strip()
+            for value in self.request.query_params.getlist('fields')
+            for name in value.split(',')
+            if name.strip()
+        ]
+        if not requested:
+            return available
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            raise ValidationError({'fields': f"Неизвестные поля: {', '.join(unknown)}."})
+        return {name: available[name] for name in dict.fromkeys(requested)}
+
+    def list_values(self, request, as_of=None):
+        """
+        Список без создания моделей: страница читается через values() только
+        с нужными колонками, строки ответа собираются из словарей напрямую
+        (поля ApplicationSerializer — простые значения, формат JSON тот же).
+
+        С ?as_of= — пагинация по курсору, статусы на момент среза для страницы
+        берутся одним запросом DISTINCT ON (statuses_as_of).
+        """
+        fields = self.get_output_fields()
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values('pk', *dict.fromkeys(fields.values()))
+        paginator = AsOfPagination() if as_of is not None else self.paginator
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.build_items(page, fields, as_of))
+
+    def build_items(self, rows, fields, as_of=None):
+        """
+        values()-строки → записи ответа. С as_of статусы на срез для всех
+        строк пачки берутся одним запросом DISTINCT ON (statuses_as_of).
+        """
+        statuses = statuses_as_of(as_of, [row['pk'] for row in rows]) if as_of is not None else None
+        items = []
+        for row in rows:
+            item = {name: row[source] for name, source in fields.items()}
+            if statuses is not None:
+                atlas, rr = statuses.get(row['pk'], (None, None))
+                if 'current_atlas_status' in item:
+                    item['current_atlas_status'] = atlas
+                if 'current_rr_status' in item:
+                    item['current_rr_status'] = rr
+            items.append(item)
+        return items
+
+    @action(detail=False, renderer_classes=[JSONRenderer, NDJSONRenderer])
+    def dump(self, request):
+        """
+        GET /api/application/dump/ — все отфильтрованные заявки одним ответом в NDJSON.
+
+        Те же фильтры, fields, since_version и as_of, что и у списка; без пагинации
+        и COUNT(*). Строки читаются серверным курсором, ?compress=gzip сжимает ответ.
+        """
+        as_of = self.get_as_of()
+        fields = self.get_output_fields()
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        rows = queryset.values('pk', *dict.fromkeys(fields.values())).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return ndjson_response(
+            rows,
+            'applications',
+            transform=lambda chunk: self.build_items(chunk, fields, as_of),
+            compress=request.query_params.get('compress') == 'gzip',
+        )
+
 class HistorySerializer(serializers.ModelSerializer):
     application = serializers.CharField(source='application.rr_id')
     class Meta:
@@ -321,17 +744,195 @@ class HistorySerializer(serializers.ModelSerializer):
 class HistoryFilter(django_filters.FilterSet):
     application_id = django_filters.CharFilter(field_name='application__rr_id', lookup_expr='exact')
 
-    snapshot_dt = django_filters.CharFilter(field_name='snapshot_dt', lookup_expr='contains')
+    # Диапазон и точный срез — условия по индексу statushistory_snapshot_idx
+    snapshot_dt_after = django_filters.IsoDateTimeFilter(field_name='snapshot_dt', lookup_expr='gte')
+    snapshot_dt_before = django_filters.IsoDateTimeFilter(field_name='snapshot_dt', lookup_expr='lte')
+    import_id = django_filters.ModelChoiceFilter(
+        queryset=ImportHistory.objects.all(),
+        method='filter_import_id',
+    )
+
+    # Старый параметр (поиск по вхождению в текст): переводится в диапазон
+    snapshot_dt = django_filters.CharFilter(method='filter_snapshot_prefix')
 
     class Meta:
         model = StatusHistory
         fields = []
 
-class HistoryViewSet(viewsets.ReadOnlyModelViewSet):
-    authentication_classes = [TokenAuthentication]
+    def filter_import_id(self, queryset, name, value):
+        return queryset.filter(snapshot_dt=value.snapshot_dt)
+
+    def filter_snapshot_prefix(self, queryset, name, value):
+        bounds = snapshot_prefix_range(value)
+        if bounds is None:
+            return queryset.none()
+        start, end = bounds
+        return queryset.filter(snapshot_dt__gte=start, snapshot_dt__lt=end)
+
+class BulkHistoryRequestSerializer(serializers.Serializer):
+    rr_ids = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=BULK_HISTORY_MAX_IDS,
+    )
+
+class HistoryViewSet(DataVersionETagMixin, viewsets.ReadOnlyModelViewSet):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     filterset_class = HistoryFilter
-    queryset = StatusHistory.objects.all()
+    # select_related: rr_id заявки берётся из того же запроса, без запроса на строку
+    queryset = StatusHistory.objects.select_related('application')
     serializer_class = HistorySerializer
     filter_backends = [DjangoFilterBackend]
-    pagination_class = Pagination
\ No newline at end of file
+    pagination_class = Pagination
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST /api/history-status/bulk/  {"rr_ids": ["...", ...]}
+
+        История статусов сразу для многих заявок одним запросом,
+        сгруппированная по rr_id (от новых срезов к старым).
+        rr_ids без истории возвращаются в списке missing.
+        """
+        params = BulkHistoryRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        rr_ids = list(dict.fromkeys(params.validated_data['rr_ids']))
+
+        history = (
+            StatusHistory.objects
+            .filter(application__rr_id__in=rr_ids)
+            .select_related('application')
+            .only('atlas_status', 'rr_status', 'snapshot_dt', 'application__rr_id')
+            .order_by('application__rr_id', '-snapshot_dt')
+        )
+
+        results = {}
+        for entry in HistorySerializer(history, many=True).data:
+            results.setdefault(entry.pop('application'), []).append(entry)
+
+        return Response({
+            'results': results,
+            'missing': [rr_id for rr_id in rr_ids if rr_id not in results],
+        })
+
+    @action(detail=False, renderer_classes=[JSONRenderer, NDJSONRenderer])
+    def dump(self, request):
+        """
+        GET /api/history-status/dump/ — записи истории одним ответом в NDJSON.
+
+        Те же фильтры, что и у списка, плюс since (срезы строго позже)
+        и as_of (срезы не позже); порядок — по snapshot_dt.
+        Строки читаются серверным курсором, ?compress=gzip сжимает ответ.
+        """
+        since = _snapshot_query_param(request, 'since')
+        as_of = _snapshot_query_param(request, 'as_of')
+        queryset = self.filter_queryset(self.get_queryset())
+        if since is not None:
+            queryset = queryset.filter(snapshot_dt__gt=since)
+        if as_of is not None:
+            queryset = queryset.filter(snapshot_dt__lte=as_of)
+        rows = (
+            queryset
+            .order_by('snapshot_dt', 'pk')
+            .values_list('application__rr_id', 'atlas_status', 'rr_status', 'snapshot_dt')
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        # Формат snapshot_dt — как в HistorySerializer (ISO в текущей временной зоне)
+        snapshot_field = serializers.DateTimeField()
+        return ndjson_response(
+            rows,
+            'history',
+            transform=lambda chunk: [
+                {
+                    'application': rr_id,
+                    'atlas_status': atlas,
+                    'rr_status': rr,
+                    'snapshot_dt': snapshot_field.to_representation(snapshot_dt),
+                }
+                for rr_id, atlas, rr, snapshot_dt in chunk
+            ],
+            compress=request.query_params.get('compress') == 'gzip',
+        )
+
+
+class SnapshotDiffView(APIView):
+    """
+    GET /api/snapshot-diff/?from=<ImportHistory id>&to=<ImportHistory id>
+
+    Заявки, у которых статус Атлас/РР отличается между двумя срезами,
+    и количество заявок по каждому переходу статуса.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        from_import = _resolve_import(request.query_params.get('from'))
+        to_import = _resolve_import(request.query_params.get('to'))
+        if from_import is None or to_import is None:
+            raise ValidationError({'detail': 'Параметры from и to должны быть id существующих импортов.'})
+
+        diff = diff_snapshots(from_import, to_import)
+
+        paginator = Pagination()
+        page = paginator.paginate_queryset(diff['changes'], request, view=self)
+        response = paginator.get_paginated_response(page)
+        response.data['from'] = {'id': from_import.pk, 'snapshot_dt': from_import.snapshot_dt}
+        response.data['to'] = {'id': to_import.pk, 'snapshot_dt': to_import.snapshot_dt}
+        response.data['atlas_transitions'] = diff['atlas_transitions']
+        response.data['rr_transitions'] = diff['rr_transitions']
+        return response
+
+
+class ApplicationAggregatesView(APIView):
+    """
+    GET /api/aggregates/?group_by=current_atlas_status&group_by=region[&as_of=...]
+
+    Количество заявок по комбинациям полей (опционально — на момент среза),
+    с теми же фильтрами, что и /api/application/. Результат кэшируется
+    по версии данных, поэтому повторные запросы до следующего импорта не идут в БД.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        group_by = [
+            field.strip()
+            for value in request.query_params.getlist('group_by')
+            for field in value.split(',')
+            if field.strip()
+        ]
+        if not group_by:
+            raise ValidationError({'group_by': f"Укажите одно или несколько полей: {', '.join(AGGREGATE_FIELDS)}."})
+        unknown = [field for field in group_by if field not in AGGREGATE_FIELDS]
+        if unknown:
+            raise ValidationError({'group_by': f"Неизвестные поля: {', '.join(unknown)}."})
+        group_by = list(dict.fromkeys(group_by))
+
+        as_of = _snapshot_query_param(request, 'as_of')
+
+        queryset = Application.objects.all()
+        if as_of is not None:
+            # Фильтры по статусу — по статусам на момент среза (см. StatusFilter)
+            queryset = annotate_statuses_as_of(queryset, as_of)
+        filterset = ApplicationFilter(request.query_params, queryset=queryset)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        filters = {
+            name: request.query_params[name]
+            for name in filterset.filters
+            if request.query_params.get(name)
+        }
+
+        cache_key = make_cache_key('aggregates', get_data_version(), group_by, as_of, filters)
+        results = cache.get(cache_key)
+        if results is None:
+            results = aggregate_applications(filterset.qs, group_by, as_of)
+            cache.set(cache_key, results, getattr(settings, 'HISTORY_LIST_CACHE_TIMEOUT', 3600))
+
+        return Response({
+            'group_by': group_by,
+            'as_of': as_of,
+            'total': sum(row['total'] for row in results),
+            'results': results,
+        })
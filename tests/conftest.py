@@ -1,13 +1,24 @@
+import threading
 import pandas as pd
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from history.models import Application, ImportHistory, ExportSchedule, StatusHistory
 from datetime import time, date, datetime
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
 @pytest.fixture
 def application():
     return Application.objects.create(rr_id="RR-001", first_name="Иван", last_name="Иванов")
@@ -139,4 +150,50 @@ def json_body():
         "applications": [
             {"rr_id": "RR-001", "program": "Python"}
         ]
-    }
\ No newline at end of file
+    }
+
+
+@pytest.fixture
+def atlas_server():
+    """
+    Локальная заглушка сервера Атласа: отдаёт файлы выгрузок
+    только при наличии куки сессии, иначе — HTML страницы логина.
+    ?name= задаёт имя файла в Content-Disposition, ?slow=1 отдаёт тело
+    в две части с паузой (чтобы параллельные загрузки пересекались).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if "sessionid=abc" not in (self.headers.get("Cookie") or ""):
+                body = b"<html>login</html>"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+            else:
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                export_id = url.path.rstrip("/").split("/")[-2]
+                name = query.get("name", [f"export_{export_id}.xlsx"])[0]
+                body = f"export {export_id}".encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+                if query.get("slow"):
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body[:3])
+                    self.wfile.flush()
+                    sleep(0.3)
+                    self.wfile.write(body[3:])
+                    return
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
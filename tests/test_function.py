@@ -1,6 +1,19 @@
+import openpyxl
 import pytest
-from history.models import Application
-from history.services import _import_dataframe, import_from_file, import_data, export_to_excel
+from io import BytesIO
+from datetime import datetime, timezone
+from history.models import Application, ImportHistory, StatusHistory
+from history.services import (
+    EXPORT_COLUMNS,
+    ImportedSnapshots,
+    _import_dataframe,
+    diff_snapshots,
+    export_to_excel,
+    filter_applications,
+    import_data,
+    import_from_file,
+    iter_export_rows,
+)
 
 @pytest.mark.django_db
 def test_import_dataframe(invalid_dataframe, snapshot_dt):
@@ -41,4 +54,73 @@ def test_export_to_excel_response(application):
     response = export_to_excel(Application.objects.all())
 
     assert response.status_code == 200
-    assert response["Content-Type"].startswith("application/vnd.openxmlformats-officedocument")
\ No newline at end of file
+    assert response["Content-Type"].startswith("application/vnd.openxmlformats-officedocument")
+
+@pytest.mark.django_db
+def test_diff_snapshots_transitions():
+    first = ImportHistory.objects.create(filename="a.xlsx", snapshot_dt=datetime(2024, 1, 1, 10, tzinfo=timezone.utc))
+    second = ImportHistory.objects.create(filename="b.xlsx", snapshot_dt=datetime(2024, 1, 1, 14, tzinfo=timezone.utc))
+
+    changed = Application.objects.create(rr_id="RR-1")
+    same = Application.objects.create(rr_id="RR-2")
+    StatusHistory.objects.create(application=changed, atlas_status="new", rr_status="created", snapshot_dt=first.snapshot_dt)
+    StatusHistory.objects.create(application=changed, atlas_status="done", rr_status="created", snapshot_dt=second.snapshot_dt)
+    StatusHistory.objects.create(application=same, atlas_status="new", rr_status="created", snapshot_dt=first.snapshot_dt)
+
+    diff = diff_snapshots(first, second)
+
+    assert [c["rr_id"] for c in diff["changes"]] == ["RR-1"]
+    assert diff["changes"][0]["atlas_from"] == "new"
+    assert diff["changes"][0]["atlas_to"] == "done"
+    assert diff["atlas_transitions"] == [{"from": "new", "to": "done", "total": 1}]
+    assert diff["rr_transitions"] == []
+
+
+@pytest.mark.django_db
+def test_export_to_excel_streams_rows(existing_application):
+    response = export_to_excel(Application.objects.all())
+
+    assert response.streaming
+    sheet = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content))).active
+    rows = list(sheet.iter_rows(values_only=True))
+
+    assert len(rows) == 2
+    assert rows[1][0] == "RR-001"
+    assert rows[1][5] == existing_application.start_date.strftime("%d.%m.%Y")
+    assert rows[1][-1] == "Не подтверждено"
+
+
+@pytest.mark.django_db
+def test_historical_export_previous_statuses():
+    t1, t2, t3 = (datetime(2024, 1, day, tzinfo=timezone.utc) for day in (1, 2, 3))
+    app = Application.objects.create(rr_id="RR-1", current_atlas_status="finished", current_rr_status="closed")
+    StatusHistory.objects.create(application=app, atlas_status="new", rr_status="created", snapshot_dt=t1)
+    StatusHistory.objects.create(application=app, atlas_status="done", rr_status="created", snapshot_dt=t2)
+    StatusHistory.objects.create(application=app, atlas_status="finished", rr_status="closed", snapshot_dt=t3)
+
+    queryset, selected_dt = filter_applications({"date": t2.isoformat()})
+    row = dict(zip([header for header, _ in EXPORT_COLUMNS], next(iter_export_rows(queryset, selected_dt))))
+
+    assert row["Текущий Статус Атлас"] == "done"
+    assert row["Предыдущий Статус Атлас"] == "new"
+    assert row["Текущий Статус РР"] == "created"
+    assert row["Предыдущий Статус РР"] is None
+
+
+@pytest.mark.django_db
+def test_imported_snapshots_preloaded(django_assert_num_queries):
+    ImportHistory.objects.create(
+        filename="export.xlsx",
+        snapshot_dt=datetime(2025, 12, 9, 11, 28, tzinfo=timezone.utc),
+    )
+
+    with django_assert_num_queries(1):
+        imported = ImportedSnapshots()
+
+    with django_assert_num_queries(0):
+        # Скрапер передаёт локальное (Europe/Moscow) время без tzinfo
+        assert imported.contains(datetime(2025, 12, 9, 14, 28))
+        assert not imported.contains(datetime(2025, 12, 10, 9, 0))
+
+        imported.add(datetime(2025, 12, 10, 9, 0))
+        assert imported.contains(datetime(2025, 12, 10, 9, 0))
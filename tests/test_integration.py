@@ -1,6 +1,20 @@
+import gzip
+import json
+import pandas as pd
 import pytest
+from datetime import date, datetime, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from history.models import Application
+from history.caching import DATA_VERSION_KEY, bump_data_version, get_data_version
+from history.models import Application, DataRevision, ExportJob, ImportHistory, StatusHistory
+from history.services import _import_dataframe, build_export_job
+from history.views import ApplicationSerializer
 
 @pytest.mark.django_db
 def test_application_list_requires_login(client):
@@ -105,3 +119,622 @@ def test_api_invalid_token(client):
     )
 
     assert response.status_code == 401
+
+
+@pytest.mark.django_db
+def test_application_list_conditional_get(client, user, existing_application):
+    client.force_login(user)
+
+    first = client.get(reverse("application_list"), {"search": "Иван"})
+    assert first.status_code == 200
+    assert first.has_header("ETag")
+
+    with CaptureQueriesContext(connection) as ctx:
+        second = client.get(
+            reverse("application_list"),
+            {"search": "Иван"},
+            HTTP_IF_NONE_MATCH=first["ETag"],
+        )
+
+    assert second.status_code == 304
+    assert not any("history_application" in q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_application_list_cache_invalidated_by_import(client, user, existing_application, valid_import_dataframe, snapshot_dt, django_capture_on_commit_callbacks):
+    client.force_login(user)
+
+    first = client.get(reverse("application_list"))
+    assert "old" in first.content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        _import_dataframe(valid_import_dataframe, snapshot_dt, "test.xlsx")
+
+    second = client.get(reverse("application_list"), HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert second.status_code == 200
+    assert second["ETag"] != first["ETag"]
+    assert "created" in second.content.decode()
+
+
+@pytest.mark.django_db
+def test_api_etag_changes_after_rebuild_command(client, token, existing_application, django_capture_on_commit_callbacks):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    first = client.get("/api/application/", **auth)
+    Application.objects.filter(pk=existing_application.pk).update(prev_atlas_status="stale")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("rebuild_prev_statuses", stdout=StringIO())
+    second = client.get("/api/application/", HTTP_IF_NONE_MATCH=first["ETag"], **auth)
+
+    assert second.status_code == 200
+    assert second["ETag"] != first["ETag"]
+
+
+@pytest.mark.django_db
+def test_api_etag_changes_after_bump_in_other_process(client, token, existing_application):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    first = client.get("/api/application/", **auth)
+
+    # Другой процесс увеличил ревизию в БД; его локальный кэш нам не виден,
+    # у нас лишь истёк TTL закэшированной версии
+    DataRevision.objects.update_or_create(pk=DataRevision.SINGLETON_PK, defaults={"revision": 10**6})
+    cache.delete(DATA_VERSION_KEY)
+    second = client.get("/api/application/", HTTP_IF_NONE_MATCH=first["ETag"], **auth)
+
+    assert second.status_code == 200
+    assert second["ETag"] != first["ETag"]
+
+
+@pytest.mark.django_db
+def test_bump_data_version_increments_revision_in_db():
+    first = bump_data_version()
+    second = bump_data_version()
+
+    assert second == first + 1
+    assert DataRevision.objects.get(pk=DataRevision.SINGLETON_PK).revision == second
+    assert get_data_version()[2] == second
+
+
+@pytest.mark.django_db
+def test_api_snapshot_diff(client, token, existing_application, existing_status_history, import_history):
+    response = client.get(
+        "/api/snapshot-diff/",
+        {"from": import_history.pk, "to": import_history.pk},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 0
+    assert "atlas_transitions" in data
+
+
+@pytest.mark.django_db
+def test_api_snapshot_diff_invalid_import(client, token):
+    response = client.get(
+        "/api/snapshot-diff/",
+        {"from": "x", "to": 1},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_snapshot_diff_page(client, user, import_history):
+    client.force_login(user)
+
+    response = client.get(reverse("snapshot_diff"), {"from": import_history.pk, "to": import_history.pk})
+
+    assert response.status_code == 200
+    assert "Нет изменений" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_background_export_queues_and_reuses_file(client, user, existing_application, settings, tmp_path, django_capture_on_commit_callbacks):
+    settings.MEDIA_ROOT = tmp_path
+    client.force_login(user)
+
+    with patch("history.tasks.build_export_file.delay") as delay:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.get(reverse("application_list"), {"export": "true", "background": "1", "search": "Иван"})
+
+    assert response.status_code == 302
+    job = ExportJob.objects.get()
+    assert job.params == {"search": "Иван"}
+    delay.assert_called_once_with(job.pk)
+
+    build_export_job(job)
+    assert job.status == ExportJob.STATUS_DONE
+
+    page = client.get(reverse("application_list"))
+    assert reverse("export_download", args=[job.pk]) in page.content.decode()
+
+    with patch("history.tasks.build_export_file.delay") as delay:
+        with django_capture_on_commit_callbacks(execute=True):
+            client.get(reverse("application_list"), {"export": "true", "background": "1", "search": "Иван"})
+    delay.assert_not_called()
+
+    download = client.get(reverse("export_download", args=[job.pk]))
+    assert download.status_code == 200
+    assert b"".join(download.streaming_content).startswith(b"PK")
+
+
+@pytest.mark.django_db
+def test_cleanup_exports_keeps_files_still_referenced(user, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    (tmp_path / "exports").mkdir()
+    for name in ("old.xlsx", "shared.xlsx"):
+        (tmp_path / "exports" / name).write_bytes(b"PK")
+
+    def make_job(name):
+        return ExportJob.objects.create(user=user, cache_key=name, status=ExportJob.STATUS_DONE, file=f"exports/{name}")
+
+    old = make_job("old.xlsx")
+    shared_old = make_job("shared.xlsx")
+    shared_fresh = make_job("shared.xlsx")
+    ExportJob.objects.filter(pk__in=[old.pk, shared_old.pk]).update(
+        created_at=datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+    )
+
+    out = StringIO()
+    call_command("cleanup_exports", "--days", "7", stdout=out)
+
+    assert list(ExportJob.objects.values_list("pk", flat=True)) == [shared_fresh.pk]
+    assert not (tmp_path / "exports" / "old.xlsx").exists()
+    assert (tmp_path / "exports" / "shared.xlsx").exists()
+    assert "Удалено записей: 2, файлов: 1" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_application_export_csv(client, user, existing_application):
+    client.force_login(user)
+
+    response = client.get(reverse("application_list"), {"export": "csv"})
+
+    assert response["Content-Type"].startswith("text/csv")
+    lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+    assert lines[0].startswith("ID заявки из РР,Фамилия,Имя")
+    assert lines[1].startswith("RR-001,Иванов,Иван")
+
+
+@pytest.mark.django_db
+def test_api_application_export_parquet(client, token, existing_application):
+    response = client.get(
+        "/api/application/?export=parquet",
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    df = pd.read_parquet(BytesIO(b"".join(response.streaming_content)))
+    assert list(df["ID заявки из РР"]) == ["RR-001"]
+    assert df["Начало периода обучения"][0] == existing_application.start_date
+
+
+@pytest.mark.django_db
+def test_api_application_export_unknown_format(client, token):
+    response = client.get(
+        "/api/application/?export=pdf",
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_application_export_selected_columns(client, token, existing_application):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(
+            "/api/application/?export=csv&columns=rr_id,current_atlas_status",
+            HTTP_AUTHORIZATION=f"Token {token.key}"
+        )
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+
+    assert lines == ["ID заявки из РР,Текущий Статус Атлас", "RR-001,old"]
+    export_sql = [q["sql"] for q in ctx.captured_queries if "history_application" in q["sql"]]
+    assert export_sql and all("program_name" not in sql for sql in export_sql)
+
+
+@pytest.mark.django_db
+def test_api_application_export_unknown_column(client, token):
+    response = client.get(
+        "/api/application/?export=csv&columns=rr_id,secret",
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_history_bulk(client, token, django_assert_max_num_queries):
+    for rr_id in ("RR-1", "RR-2", "RR-3"):
+        app = Application.objects.create(rr_id=rr_id)
+        app.history.create(atlas_status="new", rr_status="created", snapshot_dt="2024-01-01T10:00:00Z")
+        app.history.create(atlas_status="done", rr_status="created", snapshot_dt="2024-01-02T10:00:00Z")
+
+    with django_assert_max_num_queries(3):
+        response = client.post(
+            "/api/history-status/bulk/",
+            {"rr_ids": ["RR-1", "RR-2", "RR-404"]},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {token.key}"
+        )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(data["results"]) == ["RR-1", "RR-2"]
+    assert [h["atlas_status"] for h in data["results"]["RR-1"]] == ["done", "new"]
+    assert data["missing"] == ["RR-404"]
+
+
+@pytest.mark.django_db
+def test_api_history_bulk_requires_ids(client, token):
+    response = client.post(
+        "/api/history-status/bulk/",
+        {"rr_ids": []},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_application_change_feed(client, token, valid_import_dataframe, snapshot_dt):
+    second_row = valid_import_dataframe.iloc[0].to_dict()
+    second_row["ID заявки из РР"] = "RR-002"
+    df = pd.DataFrame([valid_import_dataframe.iloc[0].to_dict(), second_row])
+    _import_dataframe(df, snapshot_dt, "first.xlsx")
+    first_version = Application.objects.get(rr_id="RR-001").change_version
+
+    df.loc[1, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+
+    response = client.get(
+        "/api/application/",
+        {"since_version": first_version},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [row["rr_id"] for row in results] == ["RR-002"]
+    assert results[0]["version"] > first_version
+
+
+@pytest.mark.django_db
+def test_api_change_feed_includes_command_and_admin_edits(client, admin_client, token, valid_import_dataframe, snapshot_dt):
+    _import_dataframe(valid_import_dataframe, snapshot_dt, "first.xlsx")
+    app = Application.objects.get(rr_id="RR-001")
+    cursor = app.change_version
+
+    # Двусмысленная дата, которую исправит команда
+    Application.objects.filter(pk=app.pk).update(start_date=date(2024, 3, 5))
+    call_command("fix_dates_from_imports", stdout=StringIO())
+    after_command = Application.objects.get(pk=app.pk).change_version
+    assert after_command > cursor
+
+    history = StatusHistory.objects.filter(application=app).first()
+    response = admin_client.post(
+        reverse("admin:history_statushistory_change", args=[history.pk]),
+        {
+            "application": app.pk,
+            "atlas_status": "edited",
+            "rr_status": history.rr_status or "",
+            "snapshot_dt_0": "2024-01-01",
+            "snapshot_dt_1": "00:00:00",
+        },
+    )
+    assert response.status_code == 302
+    after_admin = Application.objects.get(pk=app.pk).change_version
+    assert after_admin > after_command
+
+    response = client.get(
+        "/api/application/",
+        {"since_import": after_command},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+    assert [row["version"] for row in response.json()["results"]] == [after_admin]
+
+
+@pytest.mark.django_db
+def test_deleting_import_repoints_last_changed_import(valid_import_dataframe, snapshot_dt):
+    _import_dataframe(valid_import_dataframe, snapshot_dt, "first.xlsx")
+    first = ImportHistory.objects.get(filename="first.xlsx")
+    df = valid_import_dataframe.copy()
+    df.loc[0, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+    app = Application.objects.get(rr_id="RR-001")
+    version = app.change_version
+    assert app.last_changed_import.filename == "second.xlsx"
+
+    ImportHistory.objects.filter(filename="second.xlsx").delete()
+
+    app.refresh_from_db()
+    assert app.last_changed_import_id == first.pk
+    assert app.change_version == version
+
+
+@pytest.mark.django_db
+def test_api_application_as_of(client, token, valid_import_dataframe, snapshot_dt):
+    _import_dataframe(valid_import_dataframe, snapshot_dt, "first.xlsx")
+    second_row = valid_import_dataframe.iloc[0].to_dict()
+    second_row["ID заявки из РР"] = "RR-002"
+    df = pd.DataFrame([valid_import_dataframe.iloc[0].to_dict(), second_row])
+    df.loc[0, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+
+    response = client.get(
+        "/api/application/",
+        {"as_of": "2024-01-01T12:00:00", "program_name": "Python"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "next" in data and "count" not in data
+    assert [(row["rr_id"], row["current_atlas_status"]) for row in data["results"]] == [("RR-001", "new")]
+
+
+@pytest.mark.django_db
+def test_api_application_as_of_filters_by_snapshot_status(client, token, valid_import_dataframe, snapshot_dt):
+    _import_dataframe(valid_import_dataframe, snapshot_dt, "first.xlsx")
+    df = valid_import_dataframe.copy()
+    df.loc[0, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+
+    approved = client.get("/api/application/", {"as_of": "2024-01-01T12:00:00", "current_atlas_status": "approved"}, **auth)
+    new = client.get("/api/application/", {"as_of": "2024-01-01T12:00:00", "current_atlas_status": "new"}, **auth)
+    current = client.get("/api/application/", {"current_atlas_status": "approved"}, **auth)
+
+    assert approved.json()["results"] == []
+    assert [row["current_atlas_status"] for row in new.json()["results"]] == ["new"]
+    assert [row["current_atlas_status"] for row in current.json()["results"]] == ["approved"]
+
+
+@pytest.mark.django_db
+def test_api_application_as_of_invalid(client, token):
+    response = client.get(
+        "/api/application/",
+        {"as_of": "not-a-date"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_aggregates(client, token, valid_import_dataframe, snapshot_dt):
+    second_row = valid_import_dataframe.iloc[0].to_dict()
+    second_row["ID заявки из РР"] = "RR-002"
+    df = pd.DataFrame([valid_import_dataframe.iloc[0].to_dict(), second_row])
+    _import_dataframe(df, snapshot_dt, "first.xlsx")
+    df.loc[0, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+
+    current = client.get("/api/aggregates/", {"group_by": "current_atlas_status,prev_atlas_status"}, **auth)
+    as_of = client.get("/api/aggregates/", {"group_by": "current_atlas_status", "as_of": "2024-01-01T12:00:00"}, **auth)
+    with CaptureQueriesContext(connection) as queries:
+        cached = client.get("/api/aggregates/", {"group_by": "current_atlas_status", "as_of": "2024-01-01T12:00:00"}, **auth)
+
+    assert current.status_code == 200
+    assert current.json()["total"] == 2
+    assert {(r["current_atlas_status"], r["prev_atlas_status"], r["total"]) for r in current.json()["results"]} == {
+        ("approved", "new", 1),
+        ("new", None, 1),
+    }
+    assert as_of.json()["results"] == [{"current_atlas_status": "new", "total": 2}]
+    assert cached.json() == as_of.json()
+    prev_as_of = client.get("/api/aggregates/", {"group_by": "prev_atlas_status", "as_of": "2024-01-02"}, **auth)
+    assert prev_as_of.json()["results"] == [{"prev_atlas_status": None, "total": 1}, {"prev_atlas_status": "new", "total": 1}]
+    assert not any("history_application" in q["sql"] for q in queries.captured_queries)
+    filtered = client.get(
+        "/api/aggregates/",
+        {"group_by": "current_atlas_status", "as_of": "2024-01-01T12:00:00", "current_atlas_status": "approved"},
+        **auth,
+    )
+    assert filtered.json()["results"] == []
+
+
+@pytest.mark.django_db
+def test_api_aggregates_unknown_field(client, token):
+    response = client.get(
+        "/api/aggregates/",
+        {"group_by": "snils"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_application_sparse_fields(client, token, existing_application):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(
+            "/api/application/",
+            {"fields": "rr_id,current_atlas_status"},
+            HTTP_AUTHORIZATION=f"Token {token.key}"
+        )
+
+    assert response.status_code == 200
+    assert response.json()["results"] == [{"rr_id": "RR-001", "current_atlas_status": "old"}]
+    select = next(q["sql"] for q in queries.captured_queries if '"history_application"."rr_id"' in q["sql"])
+    assert "program_name" not in select
+
+
+@pytest.mark.django_db
+def test_api_application_values_match_serializer(client, token, existing_application):
+    response = client.get("/api/application/", HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    expected = ApplicationSerializer(existing_application).data
+    assert response.json()["results"] == [dict(expected)]
+
+
+@pytest.mark.django_db
+def test_api_application_unknown_field(client, token):
+    response = client.get(
+        "/api/application/",
+        {"fields": "rr_id,password"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_application_dump_ndjson(client, token, existing_application):
+    response = client.get(
+        "/api/application/dump/",
+        {"fields": "rr_id,current_atlas_status"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("application/x-ndjson")
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"rr_id": "RR-001", "current_atlas_status": "old"}]
+
+
+@pytest.mark.django_db
+def test_api_application_dump_as_of_status_filter(client, token, valid_import_dataframe, snapshot_dt):
+    _import_dataframe(valid_import_dataframe, snapshot_dt, "first.xlsx")
+    df = valid_import_dataframe.copy()
+    df.loc[0, "Статус заявки в Атлас"] = "approved"
+    _import_dataframe(df, date(2024, 1, 2), "second.xlsx")
+
+    response = client.get(
+        "/api/application/dump/",
+        {"fields": "rr_id,current_atlas_status", "as_of": "2024-01-01T12:00:00", "current_atlas_status": "new"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"rr_id": "RR-001", "current_atlas_status": "new"}]
+
+
+@pytest.mark.django_db
+def test_api_history_dump_gzip(client, token, existing_status_history):
+    response = client.get(
+        "/api/history-status/dump/",
+        {"compress": "gzip", "since": "2000-01-01"},
+        HTTP_AUTHORIZATION=f"Token {token.key}"
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Encoding"] == "gzip"
+    rows = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+    assert [(row["application"], row["atlas_status"]) for row in rows] == [("RR-001", "new")]
+
+
+@pytest.mark.django_db
+def test_api_dump_requires_token(client):
+    response = client.get("/api/application/dump/")
+
+    assert response.status_code == 401
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", ["/api/application/", "/api/history-status/"])
+def test_api_list_conditional_get(client, token, existing_status_history, url):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    first = client.get(url, {"page_size": 10}, **auth)
+
+    with CaptureQueriesContext(connection) as queries:
+        second = client.get(url, {"page_size": 10}, HTTP_IF_NONE_MATCH=first["ETag"], **auth)
+    other_params = client.get(url, {"page_size": 20}, HTTP_IF_NONE_MATCH=first["ETag"], **auth)
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert not any("history_application" in q["sql"] for q in queries.captured_queries)
+    assert other_params.status_code == 200
+
+
+@pytest.mark.django_db
+def test_api_guide_runs_api_in_process(client, user, token, existing_application):
+    user.groups.add(Group.objects.create(name="Админ"))
+    client.force_login(user)
+
+    with patch("requests.get", side_effect=AssertionError("no HTTP round trip")):
+        response = client.post("/api-guide/", {"region": "", "program_name__contains": "Py"})
+
+    assert response.status_code == 200
+    assert response.context["URL"] == "http://testserver/api/application/?program_name__contains=Py"
+    assert json.loads(response.context["JsonReponse"])["count"] == 0
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path / "cache"),
+        }
+    }
+
+
+@pytest.mark.django_db
+def test_api_token_auth_is_cached(client, token, shared_cache):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    client.get("/api/application/", {"fields": "rr_id"}, **auth)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/application/", {"fields": "rr_id"}, **auth)
+
+    assert response.status_code == 200
+    assert not any("authtoken_token" in q["sql"] for q in queries.captured_queries)
+
+
+@pytest.mark.django_db
+def test_api_token_auth_not_cached_with_local_cache(client, token):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    client.get("/api/application/", {"fields": "rr_id"}, **auth)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/application/", {"fields": "rr_id"}, **auth)
+
+    assert response.status_code == 200
+    assert any("authtoken_token" in q["sql"] for q in queries.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("revoke", ["delete_token", "deactivate_user"])
+def test_api_token_cache_invalidated(client, user, token, revoke, shared_cache):
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+    assert client.get("/api/application/", **auth).status_code == 200
+
+    if revoke == "delete_token":
+        token.delete()
+    else:
+        user.is_active = False
+        user.save()
+
+    assert client.get("/api/application/", **auth).status_code == 401
+
+
+@pytest.mark.django_db
+def test_api_history_snapshot_range_filters(client, token, existing_application):
+    StatusHistory.objects.create(
+        application=existing_application, atlas_status="new", rr_status="created",
+        snapshot_dt=datetime(2025, 11, 10, 6, 0, tzinfo=dt_timezone.utc),
+    )
+    late = StatusHistory.objects.create(
+        application=existing_application, atlas_status="done", rr_status="closed",
+        snapshot_dt=datetime(2025, 11, 13, 8, 0, tzinfo=dt_timezone.utc),
+    )
+    imported = ImportHistory.objects.create(filename="x.xlsx", snapshot_dt=late.snapshot_dt, created_count=0, updated_count=1)
+    auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+
+    def statuses(params):
+        response = client.get("/api/history-status/", params, **auth)
+        assert response.status_code == 200
+        return [row["atlas_status"] for row in response.json()["results"]]
+
+    assert statuses({"snapshot_dt_after": "2025-11-12T00:00:00Z"}) == ["done"]
+    assert statuses({"snapshot_dt_before": "2025-11-12T00:00:00Z"}) == ["new"]
+    assert statuses({"import_id": imported.pk}) == ["done"]
+    assert statuses({"snapshot_dt": "2025-11-10"}) == ["new"]
+    assert statuses({"snapshot_dt": "2025-11-13 08:00"}) == ["done"]
+    assert statuses({"snapshot_dt": "garbage"}) == []
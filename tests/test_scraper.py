@@ -1,3 +1,6 @@
+import stat
+import threading
+import time
 import openpyxl
 import pytest
 import responses
@@ -6,7 +9,11 @@ from datetime import datetime
 from history.scraper import _parse_snapshot_dt
 from history.scraper import _wait_for_new_file
 from unittest.mock import MagicMock, patch
-from history.scraper import collect_and_download_exports
+from selenium.common.exceptions import NoSuchElementException
+from history.scraper import ROW_DATA_SCRIPT, ROW_TEXTS_SCRIPT, ExportItem, ExportPipeline, collect_and_download_exports, create_and_download_latest_export, load_full_history, restore_session_or_login, save_session
+from concurrent.futures import ThreadPoolExecutor
+from history.downloader import build_session, download_file
+from history.download_watcher import DownloadWatcher
 from io import BytesIO
 from django.urls import reverse
 
@@ -33,11 +40,21 @@ def test_parse_applications_from_json(json_body):
     assert len(data["applications"]) == 1
     assert data["applications"][0]["rr_id"] == "RR-001"
 
+def _write_xlsx(path, value="data"):
+    workbook = openpyxl.Workbook()
+    workbook.active["A1"] = value
+    workbook.save(path)
+
+def _browser_download(directory, name, value="data"):
+    temp = directory / f"{name}.crdownload"
+    _write_xlsx(temp, value)
+    temp.rename(directory / name)
+
 def test_wait_for_new_file(tmp_path):
     before = set(tmp_path.glob("*.xlsx"))
 
     file = tmp_path / "test.xlsx"
-    file.write_text("Hello World")
+    _write_xlsx(file)
 
     result = _wait_for_new_file(tmp_path, before, timeout=1)
 
@@ -46,24 +63,20 @@ def test_wait_for_new_file(tmp_path):
 def test_collect_exports_parses_items(tmp_path, scraper_config):
     driver = MagicMock()
 
-    item = MagicMock()
-    text_el = MagicMock()
-    text_el.text = "09.12.2025, 14:28"
-
-    item.find_element.return_value = text_el
-
     download_btn = MagicMock()
-    item.find_element.side_effect = [text_el, download_btn]
-
-    driver.find_elements.return_value = [item]
+    # Браузер пишет файл во временный .crdownload и переименовывает по окончании
+    download_btn.click.side_effect = lambda: _browser_download(tmp_path, "file.xlsx")
 
-    fake_file = tmp_path / "file.xlsx"
+    # Все строки списка — одним вызовом execute_script
+    driver.execute_script.return_value = [
+        {"text": "09.12.2025, 14:28", "button": download_btn, "url": None, "id": None},
+    ]
 
-    with patch("history.scraper._wait_for_new_file", return_value=fake_file):
-        result = collect_and_download_exports(driver, scraper_config, tmp_path, should_download=lambda title, dt: True, on_export=None)
+    result = collect_and_download_exports(driver, scraper_config, tmp_path, should_download=lambda title, dt: True, on_export=None)
 
-        assert len(result) == 1
-        assert result[0].snapshot_dt == datetime (2025, 12, 9, 14, 28)
+    assert len(result) == 1
+    assert result[0].snapshot_dt == datetime (2025, 12, 9, 14, 28)
+    assert result[0].file_path == tmp_path / "file.xlsx"
 
 @pytest.mark.django_db
 def test_xlsx_export(client, user, existing_application):
@@ -72,7 +85,7 @@ def test_xlsx_export(client, user, existing_application):
     response = client.get(
         reverse("application_list"), {"export": "1"})
 
-    open_xlsx = openpyxl.load_workbook(BytesIO(response.content))
+    open_xlsx = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
     first_sheet = open_xlsx.active
 
     headers_cap = [cell.value for cell in first_sheet[1]]
@@ -83,4 +96,264 @@ def test_xlsx_export(client, user, existing_application):
     assert "Имя" in headers_cap
     assert "RR-001" in headers_value
     assert "Иванов" in headers_value
-    assert "Иван" in headers_value
\ No newline at end of file
+    assert "Иван" in headers_value
+
+
+def _export_row(text, href):
+    return {"text": text, "button": MagicMock(), "url": href, "id": None}
+
+def test_collect_exports_over_http(tmp_path, scraper_config, atlas_server):
+    driver = MagicMock()
+    driver.current_url = f"{atlas_server}/applications"
+    driver.get_cookies.return_value = [{"name": "sessionid", "value": "abc"}]
+    # В интерфейсе новые выгрузки сверху
+    rows = [
+        _export_row("10.12.2025, 09:00", "/exports/2/download"),
+        _export_row("09.12.2025, 14:28", "/exports/1/download"),
+    ]
+    driver.execute_script.side_effect = lambda script, *args: rows if script == ROW_DATA_SCRIPT else "test-agent"
+    scraper_config["http_download"] = {"enabled": True, "max_workers": 2}
+    imported = []
+
+    with patch("history.scraper._wait_for_new_file", side_effect=AssertionError("browser download used")):
+        result = collect_and_download_exports(
+            driver, scraper_config, tmp_path, on_export=lambda item: imported.append(item.file_path.read_text())
+        )
+
+    assert imported == ["export 1", "export 2"]
+    assert [item.file_path.name for item in result] == ["export_1.xlsx", "export_2.xlsx"]
+    assert not list(tmp_path.glob("*.part"))
+
+def test_download_file_rejects_login_page(tmp_path, atlas_server):
+    session = build_session([])
+
+    with pytest.raises(PermissionError):
+        download_file(session, f"{atlas_server}/exports/1/download", tmp_path, "fallback.xlsx")
+
+def test_download_file_same_name_in_parallel(tmp_path, atlas_server):
+    session = build_session([{"name": "sessionid", "value": "abc"}], pool_size=2)
+    urls = [f"{atlas_server}/exports/{export_id}/download?name=export.xlsx&slow=1" for export_id in (1, 2)]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        paths = list(pool.map(lambda url: download_file(session, url, tmp_path, "fallback.xlsx"), urls))
+
+    assert len(set(paths)) == 2
+    assert sorted(path.read_text() for path in paths) == ["export 1", "export 2"]
+    assert not list(tmp_path.glob("*.part"))
+
+def test_download_file_removes_part_on_error(tmp_path, atlas_server):
+    session = build_session([{"name": "sessionid", "value": "abc"}])
+
+    with patch("requests.Response.iter_content", side_effect=requests.ConnectionError("reset")):
+        with pytest.raises(requests.ConnectionError):
+            download_file(session, f"{atlas_server}/exports/1/download", tmp_path, "fallback.xlsx")
+
+    assert list(tmp_path.iterdir()) == []
+
+def _session_config(tmp_path):
+    return {
+        "auth": {"login_url": "https://atlas.test/login", "success_selector": ".header"},
+        "pages": {"export_page_url": "https://atlas.test/applications"},
+        "session": {"state_file": str(tmp_path / "session.json"), "check_timeout": 0.1},
+    }
+
+def test_saved_session_skips_login(tmp_path):
+    config = _session_config(tmp_path)
+    driver = MagicMock()
+    driver.get_cookies.return_value = [{"name": "sessionid", "value": "abc", "expiry": 1}]
+    driver.execute_script.return_value = {"token": "t"}
+    save_session(driver, config)
+
+    assert stat.S_IMODE((tmp_path / "session.json").stat().st_mode) == 0o600
+
+    fresh_driver = MagicMock()
+    fresh_driver.execute_cdp_cmd.return_value = {"identifier": "1"}
+    with patch("history.scraper.login") as login_mock:
+        assert restore_session_or_login(fresh_driver, config) is True
+
+    login_mock.assert_not_called()
+    cdp = {c.args[0]: c.args[1] for c in fresh_driver.execute_cdp_cmd.call_args_list}
+    assert cdp["Network.setCookies"]["cookies"] == [{"name": "sessionid", "value": "abc", "expires": 1}]
+    # localStorage заполняется при загрузке страницы — она открывается один раз
+    assert '"token": "t"' in cdp["Page.addScriptToEvaluateOnNewDocument"]["source"]
+    assert cdp["Page.removeScriptToEvaluateOnNewDocument"] == {"identifier": "1"}
+    fresh_driver.get.assert_called_once_with("https://atlas.test/applications")
+    fresh_driver.refresh.assert_not_called()
+
+def test_rejected_session_falls_back_to_login(tmp_path):
+    config = _session_config(tmp_path)
+    (tmp_path / "session.json").write_text('{"cookies": [{"name": "sessionid", "value": "old"}]}')
+    driver = MagicMock()
+    driver.find_element.side_effect = NoSuchElementException()
+    driver.get_cookies.return_value = [{"name": "sessionid", "value": "new"}]
+    driver.execute_script.return_value = {}
+
+    with patch("history.scraper.login") as login_mock:
+        assert restore_session_or_login(driver, config) is False
+
+    login_mock.assert_called_once()
+    assert "new" in (tmp_path / "session.json").read_text()
+
+def test_collect_exports_maps_out_of_order_downloads(tmp_path, scraper_config):
+    driver = MagicMock()
+    first_btn = MagicMock()
+    second_btn = MagicMock()
+    # Сервер начинает отдавать первую выгрузку позже, чем вторую: при параллельных
+    # кликах файл второй строки появился бы раньше и был бы принят за первый
+    first_btn.click.side_effect = lambda: threading.Timer(0.3, _browser_download, (tmp_path, "a.xlsx", "first")).start()
+    second_btn.click.side_effect = lambda: _browser_download(tmp_path, "b.xlsx", "second")
+    driver.execute_script.return_value = [
+        {"text": "10.12.2025, 09:00", "button": second_btn, "url": None, "id": None},
+        {"text": "09.12.2025, 14:28", "button": first_btn, "url": None, "id": None},
+    ]
+
+    result = collect_and_download_exports(driver, scraper_config, tmp_path)
+
+    assert [(item.snapshot_dt.day, item.file_path.name) for item in result] == [(9, "a.xlsx"), (10, "b.xlsx")]
+
+def test_download_watcher_tracks_one_download_at_a_time(tmp_path):
+    with DownloadWatcher(tmp_path, poll_interval=0.05) as watcher:
+        watcher.expect("first")
+        with pytest.raises(RuntimeError):
+            watcher.expect("second")
+        _browser_download(tmp_path, "a.xlsx")
+
+        assert watcher.wait("first", timeout=5).name == "a.xlsx"
+        watcher.expect("second")
+
+def test_download_watcher_waits_for_complete_zip(tmp_path):
+    with DownloadWatcher(tmp_path, poll_interval=0.05, use_inotify=False) as watcher:
+        watcher.expect("file")
+        (tmp_path / "partial.xlsx").write_bytes(b"PK\x03\x04 not finished")
+
+        with pytest.raises(TimeoutError):
+            watcher.wait("file", timeout=0.5)
+
+def test_export_pipeline_imports_in_order_while_producer_continues():
+    imported = []
+    release = threading.Event()
+
+    def consumer(item):
+        release.wait(timeout=5)
+        imported.append(item.title)
+
+    exited = threading.Event()
+    pipeline = ExportPipeline(consumer, maxsize=3, on_exit=exited.set)
+    for title in ["a", "b", "c"]:
+        # Не блокируется, пока импорт первой выгрузки ещё идёт
+        pipeline.put(ExportItem(title=title, snapshot_dt=datetime(2025, 1, 1), file_path=None))
+    assert imported == []
+
+    release.set()
+    pipeline.close()
+
+    assert imported == ["a", "b", "c"]
+    assert exited.is_set()
+
+def test_export_pipeline_propagates_consumer_error():
+    def consumer(item):
+        raise ValueError("broken file")
+
+    pipeline = ExportPipeline(consumer)
+    pipeline.put(ExportItem(title="a", snapshot_dt=datetime(2025, 1, 1), file_path=None))
+
+    with pytest.raises(RuntimeError, match="broken file"):
+        pipeline.close()
+
+def test_load_full_history_stops_at_imported_snapshot(scraper_config):
+    driver = MagicMock()
+    rows = [["11.12.2025, 10:00", "10.12.2025, 09:00"], ["11.12.2025, 10:00", "10.12.2025, 09:00", "09.12.2025, 14:28"]]
+    heights = iter(range(100, 10000, 100))
+    scrolls = []
+
+    def execute_script(script, *args):
+        if script.strip().startswith("const [itemSelector"):
+            return rows[min(len(scrolls), len(rows) - 1)]
+        if script.startswith("return arguments[0].scrollHeight"):
+            return next(heights)
+        scrolls.append(script)
+
+    driver.execute_script.side_effect = execute_script
+    checked = []
+
+    def is_imported(dt):
+        checked.append(dt)
+        return dt == datetime(2025, 12, 9, 14, 28)
+
+    scraper_config["browser"]["incremental_stop_after"] = 1
+    with patch("history.scraper.time.sleep"):
+        load_full_history(driver, scraper_config, is_imported=is_imported)
+
+    assert len(scrolls) == 1
+    # Каждая строка проверяется один раз
+    assert checked == [datetime(2025, 12, 11, 10, 0), datetime(2025, 12, 10, 9, 0), datetime(2025, 12, 9, 14, 28)]
+
+def test_load_full_history_stops_at_multiline_row(scraper_config):
+    driver = MagicMock()
+    # Дата и время в ячейке — в разных строках
+    rows = ["11.12.2025\n10:00\nЭкспорт заявок", "10.12.2025\n09:00\nЭкспорт заявок"]
+    scrolls = []
+
+    def execute_script(script, *args):
+        if script == ROW_TEXTS_SCRIPT:
+            return rows
+        if script.startswith("return arguments[0].scrollHeight"):
+            return 100 + len(scrolls)
+        scrolls.append(script)
+
+    driver.execute_script.side_effect = execute_script
+    scraper_config["browser"]["incremental_stop_after"] = 1
+
+    with patch("history.scraper.time.sleep"):
+        load_full_history(driver, scraper_config, is_imported=lambda dt: dt == datetime(2025, 12, 10, 9, 0))
+
+    assert scrolls == []
+
+def test_load_full_history_scrolls_past_gap_below_imported(scraper_config):
+    driver = MagicMock()
+    # 11.12 импортирован (fetch_latest_export), 10.12 пропущен, ниже — импортированные
+    rows = [
+        ["11.12.2025, 10:00", "10.12.2025, 09:00"],
+        ["11.12.2025, 10:00", "10.12.2025, 09:00", "09.12.2025, 14:28", "08.12.2025, 14:28"],
+    ]
+    imported = {datetime(2025, 12, 11, 10, 0), datetime(2025, 12, 9, 14, 28), datetime(2025, 12, 8, 14, 28)}
+    heights = iter(range(100, 10000, 100))
+    scrolls = []
+
+    def execute_script(script, *args):
+        if script == ROW_TEXTS_SCRIPT:
+            return rows[min(len(scrolls), len(rows) - 1)]
+        if script.startswith("return arguments[0].scrollHeight"):
+            return next(heights)
+        scrolls.append(script)
+
+    driver.execute_script.side_effect = execute_script
+    scraper_config["browser"]["incremental_stop_after"] = 2
+
+    with patch("history.scraper.time.sleep"):
+        load_full_history(driver, scraper_config, is_imported=imported.__contains__)
+
+    # Не остановились на 11.12: прокрутили до пропуска и серии из двух срезов под ним
+    assert len(scrolls) == 1
+
+def test_latest_export_waits_with_backoff(tmp_path, scraper_config):
+    driver = MagicMock()
+    old_row = {"text": "09.12.2025, 14:28", "button": MagicMock(), "url": None, "id": None}
+    button = MagicMock()
+    button.is_enabled.side_effect = [False, True]
+    button.click.side_effect = lambda: _browser_download(tmp_path, "latest.xlsx")
+    new_row = {"text": "10.12.2025, 09:00", "button": button, "url": None, "id": None}
+    # Атлас сначала не показывает новую строку, затем показывает её с неактивной кнопкой
+    polls = iter([[old_row], [old_row], [old_row], [new_row, old_row], [new_row, old_row], [new_row, old_row]])
+    driver.execute_script.side_effect = lambda script, *args: next(polls)
+    scraper_config["new_export_wait"] = {"timeout": 60, "initial_interval": 1, "max_interval": 3}
+
+    with patch("history.scraper.WebDriverWait"), patch("history.scraper.time.sleep") as sleep:
+        item = create_and_download_latest_export(driver, scraper_config, tmp_path)
+
+    assert item.snapshot_dt == datetime(2025, 12, 10, 9, 0)
+    assert item.file_path == tmp_path / "latest.xlsx"
+    # Паузы растут вдвое до max_interval, отдельно для строки и для кнопки
+    assert [c.args[0] for c in sleep.call_args_list] == [1, 2, 1]
+    # Старые и новые строки читаются одним и тем же скриптом
+    assert {c.args[0] for c in driver.execute_script.call_args_list} == {ROW_DATA_SCRIPT}